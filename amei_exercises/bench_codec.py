@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+# Encode/decode time per message for the available wire codecs, e.g. from the repository root:
+#   python -m amei_exercises.bench_codec
+#   python -m amei_exercises.bench_codec maricopa-env=maricopa_wheat_face/env_1.json
+# Without a dumped env/result file, synthetic messages shaped like the exercise payloads are used.
+
+import json
+import random
+import statistics
+import sys
+import time
+from zalfmas_common import common
+
+from amei_exercises import codec
+
+
+def synthetic_maricopa_env(no_of_days=4000):
+    """an env like the Maricopa producer sends, dominated by its climateData lists"""
+    rnd = random.Random(1)
+    return {
+        "type": "Env",
+        "params": {
+            "siteParameters": {
+                "SoilProfileParameters": [{"Thickness": [0.1, "m"], "FieldCapacity": [0.3, "m3/m3"]}
+                                          for _ in range(20)],
+                "Latitude": 33.07,
+            },
+            "simulationParameters": {"SoilTempModel": "internal"},
+        },
+        "cropRotation": [{"worksteps": [{"type": "Irrigation", "date": f"1993-03-{d:02d}", "amount": [25.0, "mm"]}
+                                        for d in range(1, 29)]}],
+        "climateData": {
+            "startDate": "1992-12-01",
+            "endDate": "2003-12-31",
+            "data": {acdi: [round(rnd.uniform(-5, 40), 2) for _ in range(no_of_days)]
+                     for acdi in [3, 4, 5, 6, 8, 9, 12, 14]},
+            "tamp": 13.3,
+            "tav": 21.8,
+        },
+        "customId": {"env_id": 1, "st_model": "internal", "model_code": "iMO", "treatment_id": "1"},
+    }
+
+
+def synthetic_sensitivity_result(no_of_days=10958):
+    """a result message like the sensitivity consumer receives (30 years of daily values)"""
+    rnd = random.Random(2)
+
+    def layers(n):
+        return [round(rnd.uniform(-10, 30), 6) for _ in range(n)]
+
+    results = []
+    for i in range(no_of_days):
+        results.append({
+            "Date": f"{1991 + i // 365}-01-01",
+            "SurfTemp": round(rnd.uniform(-10, 30), 6),
+            "SoilTemp": layers(42),
+            "AMEI_Monica_SurfTemp": round(rnd.uniform(-10, 30), 6),
+            "AMEI_Monica_SoilTemp": layers(42),
+            "AMEI_DSSAT_ST_standalone_SoilTemp": layers(10),
+            "AMEI_DSSAT_EPICST_standalone_SoilTemp": layers(10),
+            "AMEI_Simplace_Soil_Temperature_SoilTemp": layers(10),
+            "AMEI_Stics_soil_temperature_SoilTemp": layers(10),
+            "AMEI_BiomaSurfacePartonSoilSWATC_SoilTemp": layers(10),
+            "AMEI_BiomaSurfaceSWATSoilSWATC_SoilTemp": layers(10),
+            "AMEI_ApsimCampbell_SoilTemp": layers(10),
+        })
+    return {
+        "customId": {"env_id": 1, "location": "CAQC", "soil": "SICL", "lai": "L0", "aw": "AW0.00"},
+        "data": [{"results": results}],
+    }
+
+
+def bench(msg, codec_, repeats):
+    encode_times = []
+    decode_times = []
+    frames = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        frames = codec.encode_frames(msg, codec_)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        codec.decode_frames(frames, codec_)
+        decode_times.append(time.perf_counter() - start)
+    return sum(map(len, frames)), statistics.median(encode_times), statistics.median(decode_times)
+
+
+def run_benchmark():
+    config = {
+        "maricopa-env": "",  # path to a dumped Maricopa env (json), otherwise synthetic
+        "sensitivity-result": "",  # path to a dumped sensitivity result message (json), otherwise synthetic
+        "codecs": "json,orjson,msgpack",
+        "repeats": "5",
+    }
+    common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
+
+    payloads = {}
+    for name, path, create in [("maricopa env", config["maricopa-env"], synthetic_maricopa_env),
+                               ("sensitivity result", config["sensitivity-result"], synthetic_sensitivity_result)]:
+        if path:
+            with open(path) as _:
+                payloads[name] = json.load(_)
+        else:
+            payloads[name] = create()
+
+    for payload_name, msg in payloads.items():
+        print(payload_name)
+        for codec_name in config["codecs"].split(","):
+            try:
+                codec_ = codec.get_codec(codec_name.strip())
+            except ImportError as e:
+                print(f"  {codec_name:8} not available ({e})")
+                continue
+            size, encode_s, decode_s = bench(msg, codec_, int(config["repeats"]))
+            print(f"  {codec_name:8} {size / 1e6:8.2f} MB  encode {encode_s * 1000:9.1f} ms  decode {decode_s * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+# Stand-in service between producers running with climate-by-ref=true and the monica-zmq-proxy.
+# Start it near the proxy, e.g. from the repository root:
+#   python -m amei_exercises.climate_resolver in-port=6665 server=localhost server-port=6666
+# and let the producer connect to it: python run-producer.py climate-by-ref=true server-port=6665
+# Envs sent with a non JSON codec (codec=msgpack) are re-encoded as JSON for MONICA on the way.
+# A producer publishes each climate block only once, so the resolver keeps all blocks in spool-dir on disk
+# (surviving a restart) and only the most recently used ones in memory. An env whose block is unknown
+# nevertheless is answered with an error result to the consumers (result-server-port), so they don't wait for it.
+
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import re
+import sys
+import zmq
+from zalfmas_common import common
+
+from amei_exercises import codec
+from amei_exercises.climate_store import CLIMATE_FRAME
+
+CLIMATE_REF_PATTERN = re.compile(rb'"climateDataRef"\s*:\s*"([0-9a-f]{64})"')
+
+
+def run_resolver(server=None, port=None):
+    config = {
+        "in-port": "6665",
+        "server-port": port if port else "6666",
+        "server": server if server else "localhost",
+        "cache-size": "256",  # number of climate blocks kept in memory
+        "spool-dir": "climate_spool",  # all climate blocks received, read back if not in memory
+        "result-server-port": "7788",  # frontend of the out proxy (on server) to send error results to
+        "codec": "json",  # codec for the envs sent on to MONICA: json or orjson
+    }
+    common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
+
+    context = zmq.Context()
+    in_socket = context.socket(zmq.PULL)
+    in_socket.bind("tcp://*:" + str(config["in-port"]))
+    out_socket = context.socket(zmq.PUSH)
+    out_socket.connect("tcp://" + config["server"] + ":" + str(config["server-port"]))
+    result_socket = context.socket(zmq.PUSH)
+    result_socket.connect("tcp://" + config["server"] + ":" + str(config["result-server-port"]))
+
+    out_codec = codec.get_codec(config["codec"])
+    cache_size = int(config["cache-size"])
+    climate_cache = OrderedDict()  # hash -> encoded climateData
+    spool_dir = Path(config["spool-dir"])
+    spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def keep_climate(h, climate_bytes):
+        climate_cache[h] = climate_bytes
+        climate_cache.move_to_end(h)
+        if len(climate_cache) > cache_size:
+            climate_cache.popitem(last=False)
+
+    def cached_climate(h):
+        climate_bytes = climate_cache.get(h)
+        if climate_bytes is not None:
+            climate_cache.move_to_end(h)
+            return climate_bytes
+        try:
+            climate_bytes = (spool_dir / h.decode("ascii")).read_bytes()
+        except FileNotFoundError:
+            return None
+        keep_climate(h, climate_bytes)
+        return climate_bytes
+
+    def send_error(custom_id, h):
+        error = "climate_resolver.py: unknown climateDataRef " + h.decode("ascii")
+        print(error, "-> sending an error result for customId:", custom_id)
+        result_socket.send(json.dumps({"customId": custom_id, "errors": [error]}).encode("utf-8"))
+
+    resolved_count = 0
+    while True:
+        frames = in_socket.recv_multipart()
+        if len(frames) == 3 and frames[0] == CLIMATE_FRAME:
+            h = frames[1]
+            path = spool_dir / h.decode("ascii")
+            if not path.exists():
+                tmp_path = path.with_name(path.name + ".tmp")
+                tmp_path.write_bytes(frames[2])
+                os.replace(tmp_path, path)
+            keep_climate(h, frames[2])
+            continue
+
+        resolved = False
+        if len(frames) == 2:
+            # env in a non JSON codec -> decode, resolve and encode as JSON for MONICA
+            env = codec.decode_frames(frames, out_codec)
+            h = env.pop("climateDataRef", "").encode("ascii")
+            if h:
+                climate_bytes = cached_climate(h)
+                if climate_bytes is None:
+                    send_error(env.get("customId"), h)
+                    continue
+                env["climateData"] = json.loads(climate_bytes)
+                resolved = True
+            env_bytes = out_codec.encode(env)
+        else:
+            env_bytes = frames[-1]
+            m = CLIMATE_REF_PATTERN.search(env_bytes)
+            if m:
+                climate_bytes = cached_climate(m.group(1))
+                if climate_bytes is None:
+                    send_error(json.loads(env_bytes).get("customId"), m.group(1))
+                    continue
+                # splice the climate data into the env without decoding the whole message
+                env_bytes = b"".join([env_bytes[:m.start()], b'"climateData":', climate_bytes, env_bytes[m.end():]])
+                resolved = True
+        out_socket.send(env_bytes)
+
+        if resolved:
+            resolved_count += 1
+            if resolved_count % 100 == 0:
+                print("resolved", resolved_count, "envs,", len(climate_cache), "climate blocks cached")
+
+
+if __name__ == "__main__":
+    run_resolver()
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+# Wire codecs for env and result messages.
+# JSON producing codecs (json, orjson) send a single frame, exactly what MONICA and older scripts expect.
+# Other codecs (msgpack) prefix the payload with a header frame naming the codec, so they can only be
+# used between our own peers (e.g. producer -> climate_resolver). Receivers accept both forms.
+
+import json
+
+import numpy as np
+
+CODEC_HEADER_PREFIX = b"amei:codec:"
+
+
+class JsonCodec:
+    name = "json"
+    json_compatible = True
+
+    def encode(self, obj):
+        return json.dumps(obj).encode("utf-8")
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    json_compatible = True
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def encode(self, obj):
+        return self._orjson.dumps(obj, option=self._options)
+
+    def decode(self, data):
+        return self._orjson.loads(data)
+
+
+NUMPY_EXT_TYPE = 42
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    json_compatible = False
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def _default(self, obj):
+        if isinstance(obj, np.ndarray):
+            header = json.dumps([obj.dtype.str, obj.shape]).encode("utf-8")
+            return self._msgpack.ExtType(NUMPY_EXT_TYPE, header + b"\n" + np.ascontiguousarray(obj).tobytes())
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Can't msgpack object of type {type(obj)}")
+
+    def _ext_hook(self, code, data):
+        if code == NUMPY_EXT_TYPE:
+            header, array_bytes = data.split(b"\n", 1)
+            dtype, shape = json.loads(header)
+            return np.frombuffer(array_bytes, dtype=np.dtype(dtype)).reshape(shape)
+        return self._msgpack.ExtType(code, data)
+
+    def encode(self, obj):
+        return self._msgpack.packb(obj, default=self._default, use_bin_type=True)
+
+    def decode(self, data):
+        return self._msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    "json": JsonCodec,
+    "orjson": OrjsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+_codec_instances = {}
+
+
+def get_codec(name):
+    """codec by name, raises ValueError for unknown names and ImportError if the codec's library is missing"""
+    name = name.decode("ascii") if isinstance(name, bytes) else name
+    if name not in _codec_instances:
+        if name not in CODECS:
+            raise ValueError(f"Unknown codec '{name}', choose one of {list(CODECS.keys())}")
+        _codec_instances[name] = CODECS[name]()
+    return _codec_instances[name]
+
+
+def encode_frames(obj, codec):
+    if codec.json_compatible:
+        return [codec.encode(obj)]
+    return [CODEC_HEADER_PREFIX + codec.name.encode("ascii"), codec.encode(obj)]
+
+
+def decode_frames(frames, codec):
+    """decode a received message, a header frame overrides the given (JSON) codec"""
+    if len(frames) == 2 and frames[0].startswith(CODEC_HEADER_PREFIX):
+        codec = get_codec(frames[0][len(CODEC_HEADER_PREFIX):])
+    return codec.decode(frames[-1])
+
+
+def send(socket, obj, codec):
+    socket.send_multipart(encode_frames(obj, codec))
+
+
+def recv(socket, codec):
+    return decode_frames(socket.recv_multipart(), codec)
+
+
+_MISSING = object()
+
+
+class EnvSplicer:
+    """encode an env once and splice in only the values at the given paths for every send"""
+
+    def __init__(self, env, paths, codec):
+        self.env = env
+        self.paths = [tuple(path) for path in paths]
+        self.codec = codec
+        self.parts = None
+        self.slot_order = None
+        if codec.json_compatible:
+            self._prepare()
+
+    def _prepare(self):
+        originals = []
+        placeholders = []
+        for i, path in enumerate(self.paths):
+            parent = self.env
+            for key in path[:-1]:
+                parent = parent[key]
+            originals.append((parent, path[-1], parent.get(path[-1], _MISSING)))
+            placeholder = f"@@amei-splice-{i}@@"
+            parent[path[-1]] = placeholder
+            placeholders.append(self.codec.encode(placeholder))
+        try:
+            env_bytes = self.codec.encode(self.env)
+        finally:
+            for parent, key, value in originals:
+                if value is _MISSING:
+                    del parent[key]
+                else:
+                    parent[key] = value
+
+        positions = []
+        for i, placeholder in enumerate(placeholders):
+            pos = env_bytes.find(placeholder)
+            if pos < 0 or env_bytes.find(placeholder, pos + 1) >= 0:
+                # placeholder not found exactly once (e.g. the codec escaped it), use full encoding instead
+                return
+            positions.append((pos, i, len(placeholder)))
+        positions.sort()
+
+        self.parts = []
+        self.slot_order = []
+        last = 0
+        for pos, i, length in positions:
+            self.parts.append(env_bytes[last:pos])
+            self.slot_order.append(i)
+            last = pos + length
+        self.parts.append(env_bytes[last:])
+
+    def encode_frames(self, *values):
+        """the frames of the env with values assigned to the paths (in order of the paths)"""
+        if self.parts is None:
+            for path, value in zip(self.paths, values):
+                parent = self.env
+                for key in path[:-1]:
+                    parent = parent[key]
+                parent[path[-1]] = value
+            return encode_frames(self.env, self.codec)
+
+        chunks = [self.parts[0]]
+        for slot, part in zip(self.slot_order, self.parts[1:]):
+            chunks.append(self.codec.encode(values[slot]))
+            chunks.append(part)
+        return [b"".join(chunks)]
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Completion tracking shared by several consumers pulling from the same out proxy.
+# Only one consumer receives the no_of_sent_envs message of a producer (shard) and each one receives
+# only a part of the results, so the consumers count in one file instead, per job and producer run:
+#   {"jobs": {<job>: {"runs": {<run>: {"received": <results received by all consumers>, "sent": <no_of_sent_envs>,
+#                                      "sent_env_ids": <ranges of the sent env ids>}}}}}
+# Start all consumers with the same shared-counter=<file> and the producers and consumers of a job with the same
+# job=<id> (sent along in the customIds). Only the results and runs of the consumer's job are counted, so the runs
+# of earlier (finished or aborted) jobs in the file are ignored and the file needn't be deleted before a new job.
+# Without a job id, the runs in the file are only ignored if all of them were complete when the consumer started.
+# A consumer waits with a short timeout (counter-poll-ms) and leaves once the count is reached.
+
+import json
+import os
+from pathlib import Path
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedCounter:
+    def __init__(self, path_to_counter, expected_shards=1, job=""):
+        self.path_to_counter = Path(path_to_counter)
+        self.path_to_lock = Path(str(path_to_counter) + ".lock")
+        self.expected_shards = expected_shards
+        self.job = str(job)
+        self.path_to_counter.parent.mkdir(parents=True, exist_ok=True)
+        self.stale_runs = set()
+        self.state = self._update(lambda state: None)
+        runs = self._runs(self.state)
+        if not self.job and len(runs) >= expected_shards and all(self._complete(run) for run in runs.values()):
+            # the runs of a finished job, not the one the consumer is started for
+            self.stale_runs = set(runs)
+
+    def _update(self, change):
+        """apply change to the counter state under the file lock, returns the new state"""
+        with open(self.path_to_lock, "a+b") as lock:
+            _lock(lock)
+            try:
+                try:
+                    with open(self.path_to_counter) as _:
+                        state = json.load(_)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                state.setdefault("jobs", {}).setdefault(self.job, {}).setdefault("runs", {})
+                if change(state) is not False:
+                    tmp = self.path_to_counter.with_name(self.path_to_counter.name + "." + str(os.getpid()))
+                    with open(tmp, "w") as _:
+                        json.dump(state, _)
+                    os.replace(tmp, self.path_to_counter)
+            finally:
+                _unlock(lock)
+        return state
+
+    @staticmethod
+    def _complete(run):
+        return "sent" in run and run["received"] >= run["sent"]
+
+    def _runs(self, state):
+        return state["jobs"][self.job]["runs"]
+
+    def _current_runs(self):
+        return {run_id: run for run_id, run in self._runs(self.state).items() if run_id not in self.stale_runs}
+
+    def received(self, run_id, count=1, job=""):
+        """count results of the producer run received by this consumer, returns True if all consumers are done,
+        results of other jobs aren't counted"""
+        if str(job) != self.job:
+            return self.done()
+
+        def add(state):
+            self._runs(state).setdefault(str(run_id), {"received": 0})["received"] += count
+
+        self.state = self._update(add)
+        return self.done()
+
+    def sent(self, no_of_sent_envs, run_id, sent_env_ids=None, job=""):
+        """record the no_of_sent_envs message of a producer (shard), returns True if all consumers are done"""
+        if str(job) != self.job:
+            return self.done()
+
+        def record(state):
+            run = self._runs(state).setdefault(str(run_id), {"received": 0})
+            run["sent"] = no_of_sent_envs
+            if sent_env_ids is not None:
+                run["sent_env_ids"] = sent_env_ids
+
+        self.state = self._update(record)
+        return self.done()
+
+    def poll(self):
+        """reread the counter, returns True if all consumers are done"""
+        self.state = self._update(lambda state: False)
+        return self.done()
+
+    def sent_env_ids(self):
+        """run -> ranges of the env ids sent by the producer (shard) of the run"""
+        return {run_id: run["sent_env_ids"] for run_id, run in self._current_runs().items() if "sent_env_ids" in run}
+
+    def received_count(self):
+        return sum(run["received"] for run in self._current_runs().values())
+
+    def expected(self):
+        """number of envs sent by all producers or None if not all of them are finished"""
+        runs = self._current_runs().values()
+        if len(runs) < self.expected_shards or not all("sent" in run for run in runs):
+            return None
+        return sum(run["sent"] for run in runs)
+
+    def done(self):
+        expected = self.expected()
+        return expected is not None and self.received_count() >= expected
+
+    def summary(self):
+        return "completion{}: {} of {} envs received by all consumers".format(
+            " of job " + self.job if self.job else "", self.received_count(),
+            self.expected() if self.expected() is not None else "?")
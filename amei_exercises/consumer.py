@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Receive loop shared by the consumers of the exercises. A consumer script defines its exercise specific
+# parts (writing the text files of a result, the keys in the result store, the layered results) and calls
+#   config = consumer.default_config(server, port)
+#   common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
+#   consumer.run(config, EXERCISE, write_results, store_keys)
+
+import os
+
+import zmq
+
+from amei_exercises import (codec, completion, flow_control, layer_store, manifest, progress, result_cache,
+                            result_store, resubmit, writer_pool)
+
+
+def default_config(server=None, port=None):
+    """the config keys common to all consumers"""
+    return {
+        "mode": "remoteConsumer-remoteMonica",
+        "port": port if port else "7777",
+        "server": server if server else "localhost",  # "login01.cluster.zalf.de",
+        "writer_sr": None,
+        "path_to_out": "out",
+        "timeout": 600000,  # 10min
+        "codec": "json",  # decoder for plain (JSON) result messages: json or orjson
+        "manifest": "",  # e.g. out/manifest.jsonl -> record the finished envs (incremental reruns, duplicates, restarts)
+        "result-cache": "",  # directory to store the results in, producers started with it send cached results directly
+        "result-cache-max-mb": "10000",
+        "monica-version": "3.6.36",  # part of the result cache key
+        "expected-shards": "1",  # number of producer shards (shard=i/n) whose results this consumer collects
+        "shared-counter": "",  # e.g. out/consumers.count -> several consumers on the same port count together
+        "job": "",  # id of the job (as given to its producers), the shared-counter only counts the envs of this job
+        "counter-poll-ms": "1000",  # receive timeout of a consumer with shared-counter before it rereads the counter
+        "progress-every-s": "10",  # report the progress every n seconds, 0 -> print the customId of every result
+        "resubmit-list": "",  # e.g. out/resubmit.json -> write the outstanding env ids at a timeout (producer resubmit=)
+        "ack-to": "",  # e.g. localhost:7780 -> acknowledge written results to a producer started with max-in-flight
+        "writer-threads": "0",  # > 0 -> write the results in threads while receiving the next ones
+        "writer-queue": "64",  # max number of received results waiting to be written
+        "result-store": "",  # e.g. out/results -> append the results to a partitioned Parquet store (needs pyarrow)
+        "result-store-flush-rows": "200000",  # write the buffered rows to the store after n rows
+        "result-store-flush-s": "60",  # or after n seconds, the results are recorded in the manifest once written
+        "text-files": True,  # false -> write the results only to the result-store, export them with export-from=...
+        "export-from": "",  # e.g. out/results -> write the text files of all results in the store and exit
+    }
+
+
+def run(config, exercise, write_results, store_keys, layer_results=None, layer_variables=None, received=None,
+        leave_on_timeout=False):
+    """receive the results of the workers until the producers' no_of_sent_envs are reached
+    write_results(msg, path_to_out) -> paths of the text files written for a result message
+    store_keys(custom_id) -> (model_code, treatment) of a result in the result store
+    layer_results(msg) -> daily results to keep in the layer store (with config layer-store=...)
+    received(msg) is called in the receive loop for every result
+    leave_on_timeout -> stop at the first timeout instead of waiting for further results"""
+
+    path_to_out = config["path_to_out"]
+    if not os.path.exists(path_to_out):
+        try:
+            os.makedirs(path_to_out)
+        except OSError:
+            print("run-consumer.py: Couldn't create dir:", path_to_out, "!")
+
+    if config["export-from"]:
+        for msg in result_store.read_messages(config["export-from"], exercise):
+            print("exporting customId:", msg["customId"])
+            write_results(msg, path_to_out)
+        return
+
+    wire_codec = codec.get_codec(config["codec"])
+
+    context = zmq.Context()
+    socket = context.socket(zmq.PULL)
+
+    socket.connect("tcp://" + config["server"] + ":" + config["port"])
+    socket.RCVTIMEO = int(config["timeout"])
+
+    counter = None
+    if config["shared-counter"]:
+        counter = completion.SharedCounter(config["shared-counter"], int(config["expected-shards"]), job=config["job"])
+        socket.RCVTIMEO = int(config["counter-poll-ms"])
+    waited_ms = 0
+
+    done_envs = manifest.Manifest(config["manifest"]) if config["manifest"] else None
+    cached_results = None
+    if config["result-cache"]:
+        cached_results = result_cache.ResultCache(config["result-cache"], config["monica-version"],
+                                                  max_size_mb=float(config["result-cache-max-mb"]))
+    ack_sender = flow_control.AckSender(context, config["ack-to"]) if config["ack-to"] else None
+
+    store = None
+    if config["result-store"]:
+        store = result_store.ResultStore(config["result-store"], exercise,
+                                         flush_rows=int(config["result-store-flush-rows"]),
+                                         flush_s=float(config["result-store-flush-s"]))
+    layers = None
+    if layer_results and config.get("layer-store"):
+        layers = layer_store.LayerStore(config["layer-store"])
+
+    def write(msg):
+        outputs = write_results(msg, path_to_out) if config["text-files"] else []
+        custom_id = msg["customId"]
+        if cached_results and "fingerprint" in custom_id and msg.get("data") and not msg.get("fromResultCache"):
+            cached_results.put(custom_id["fingerprint"], msg)
+        return outputs
+
+    def written(msg, outputs):
+        custom_id = msg["customId"]
+
+        def record():
+            if done_envs and msg.get("data"):
+                done_envs.add(custom_id, outputs)
+
+        if store:
+            # the env is recorded as done once its results are in a file of the store
+            store.append(msg, *store_keys(custom_id), on_stored=record)
+        else:
+            record()
+        if layers:
+            for results in layer_results(msg):
+                layers.append_results(custom_id, results, layer_variables)
+        if ack_sender:
+            ack_sender.ack(custom_id["env_id"])
+
+    def failed(msg, _e):
+        # release the producer's credit, the failure is counted in the writer pool summary
+        if ack_sender:
+            ack_sender.ack(msg["customId"]["env_id"])
+
+    writer = writer_pool.create_writer(write, written, config, failed=failed)
+
+    report_every_s = float(config["progress-every-s"])
+    env_progress = progress.Progress(report_every_s)
+
+    def report_progress(force=False):
+        if report_every_s > 0 or force:
+            if counter:
+                line = env_progress.report(counter.received_count(), counter.expected(), force)
+            else:
+                line = env_progress.report(envs_received, no_of_envs_expected, force)
+            if line:
+                print(line)
+
+    def report_outstanding():
+        if counter:
+            for run_id, sent_env_ids in counter.sent_env_ids().items():
+                env_progress.sent(run_id, sent_env_ids)
+        missing = env_progress.outstanding(done_envs)
+        print(env_progress.outstanding_summary(missing))
+        if config["resubmit-list"] and missing:
+            resubmit.write_list(config["resubmit-list"], [env_id for ids in missing.values() for env_id in ids])
+            print("wrote the outstanding env ids to", config["resubmit-list"])
+
+    envs_received = 0
+    duplicate_envs = 0
+    error_envs = 0
+    seen_envs = set()
+    counted_runs = set()
+    no_of_envs_expected = None
+    no_of_sent_envs_per_shard = {}
+    leave = False
+    while not leave:
+        try:
+            msg: dict = codec.recv(socket, wire_codec)
+
+            custom_id = msg["customId"]
+            if "no_of_sent_envs" in custom_id:
+                no_of_sent_envs_per_shard[custom_id.get("shard", "")] = custom_id["no_of_sent_envs"]
+                if len(no_of_sent_envs_per_shard) == int(config["expected-shards"]):
+                    no_of_envs_expected = sum(no_of_sent_envs_per_shard.values())
+                env_progress.sent(custom_id.get("run"), custom_id.get("sent_env_ids"))
+                if counter and counter.sent(custom_id["no_of_sent_envs"], custom_id.get("run"),
+                                            custom_id.get("sent_env_ids"), job=custom_id.get("job", "")):
+                    leave = True
+            else:
+                result_key = manifest.result_key(custom_id)
+                if result_key in seen_envs or (done_envs and done_envs.is_duplicate(custom_id)):
+                    duplicate_envs += 1
+                    print("skipped duplicate result customId:", custom_id)
+                    # the producer took a credit for the env, the duplicate doesn't count towards the expected envs
+                    if ack_sender:
+                        ack_sender.ack(custom_id["env_id"])
+                    continue
+                seen_envs.add(result_key)
+                run_id = custom_id.get("run")
+                if done_envs and not counter and run_id and run_id not in counted_runs:
+                    # after a restart the envs of the run written before count towards the expected envs
+                    counted_runs.add(run_id)
+                    written_before = done_envs.run_count(run_id)
+                    if written_before:
+                        print("continuing run", run_id, "with", written_before, "envs written before")
+                    envs_received += written_before
+                envs_received += 1
+                if msg.get("errors") and not msg.get("data"):
+                    # e.g. from the climate_resolver, counts towards the expected envs but stays outstanding
+                    error_envs += 1
+                    print("received error result customId:", custom_id, "errors:", msg["errors"])
+                    if ack_sender:
+                        ack_sender.ack(custom_id["env_id"])
+                else:
+                    env_progress.received(custom_id)
+                    if report_every_s <= 0:
+                        print("received result customId:", custom_id)
+
+                    if received:
+                        received(msg)
+
+                    writer.submit(msg)
+                if counter and counter.received(custom_id.get("run"), job=custom_id.get("job", "")):
+                    leave = True
+
+            if no_of_envs_expected == envs_received or leave:
+                print("last expected env received")
+                leave = True
+            else:
+                report_progress()
+            waited_ms = 0
+
+        except zmq.error.Again as _e:
+            if counter:
+                if counter.poll():
+                    print("last expected env received by another consumer")
+                    leave = True
+                    continue
+                report_progress()
+                waited_ms += socket.RCVTIMEO
+                if waited_ms < int(config["timeout"]):
+                    continue
+                waited_ms = 0
+            print('no response from the server (with "timeout"=%d ms) ' % int(config["timeout"]))
+            report_outstanding()
+            if leave_on_timeout:
+                break
+        except Exception as e:
+            print("Exception:", e)
+            break
+
+    writer.close()
+    report_progress(force=True)
+    print(writer.summary())
+    if duplicate_envs:
+        print("skipped", duplicate_envs, "duplicate results")
+    if error_envs:
+        print("received", error_envs, "error results")
+        report_outstanding()
+    if counter:
+        print(counter.summary())
+    if store:
+        store.close()
+        print(store.summary())
+    if layers:
+        print(layers.summary())
+    if ack_sender:
+        ack_sender.close()
+    if cached_results:
+        print(cached_results.summary())
@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Stable fingerprints of envs: a hash over the canonical JSON of everything that determines the results
+# (params, worksteps, climate data or its reference, output spec), but not the customId.
+
+import hashlib
+import json
+
+
+def canonical_hash(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def env_fingerprint(env, exclude_paths=(("customId",),)):
+    """fingerprint of an env without the values at exclude_paths (the env itself is not modified)"""
+    removed = []
+    for path in exclude_paths:
+        parent = env
+        for key in path[:-1]:
+            parent = parent.get(key, {})
+        if path[-1] in parent:
+            removed.append((parent, path[-1], parent.pop(path[-1])))
+    try:
+        return canonical_hash(env)
+    finally:
+        for parent, key, value in reversed(removed):
+            parent[key] = value
+
+
+def combine(base_fingerprint, *values):
+    """fingerprint of an env whose base fingerprint excluded some paths, from the values at these paths"""
+    return canonical_hash([base_fingerprint, *values])
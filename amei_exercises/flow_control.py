@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Credit based flow control between a producer and its consumers.
+# The producer binds a PULL socket (ack-port) and keeps at most max-in-flight envs unacknowledged,
+# every consumer started with ack-to=<producer host>:<ack-port> acknowledges each result it has written.
+# Start e.g. python run-producer.py max-in-flight=60 and python run-consumer.py ack-to=localhost:7780
+# Results that couldn't be written and skipped duplicates are acknowledged too. The credit of an env lost on the way
+# (e.g. a crashed MONICA worker) is released with a warning once it isn't acknowledged within credit-lease-s.
+
+import json
+import time
+
+import zmq
+
+
+class CreditGate:
+    """producer side, blocks before sending an env as long as max_in_flight envs are not acknowledged"""
+
+    def __init__(self, context, port, max_in_flight, wait_report_ms=60000, lease_s=600):
+        self.max_in_flight = max_in_flight
+        self.wait_report_ms = wait_report_ms
+        self.lease_s = lease_s
+        self.in_flight = 0
+        self.acked = 0
+        self.expired = 0
+        self.leases = {}  # env_id -> times the credits for the env were taken
+        self.socket = context.socket(zmq.PULL)
+        self.socket.bind("tcp://*:" + str(port))
+
+    def _release(self, env_id):
+        times = self.leases.get(env_id)
+        if not times:
+            # e.g. the ack of an env whose lease already expired
+            return False
+        times.pop(0)
+        if not times:
+            del self.leases[env_id]
+        self.in_flight -= 1
+        return True
+
+    def _take_acks(self):
+        while True:
+            try:
+                msg = self.socket.recv(zmq.NOBLOCK)
+            except zmq.error.Again:
+                return
+            self.acked += 1
+            self._release(json.loads(msg).get("env_id"))
+
+    def _expire_leases(self):
+        """release the credits of envs not acknowledged within lease_s"""
+        oldest = time.monotonic() - self.lease_s
+        expired = [env_id for env_id, times in self.leases.items() for t in times if t < oldest]
+        for env_id in expired:
+            self._release(env_id)
+        if expired:
+            self.expired += len(expired)
+            print("flow_control: no acknowledgement within", self.lease_s, "s, released the credits of env ids",
+                  sorted(expired, key=str))
+
+    def acquire(self, env_id=None):
+        """wait for a free credit and take it for the env env_id"""
+        self._take_acks()
+        while self.in_flight >= self.max_in_flight:
+            if self.socket.poll(self.wait_report_ms):
+                self._take_acks()
+                continue
+            self._expire_leases()
+            if self.in_flight >= self.max_in_flight:
+                print("flow_control: waiting for acknowledgements,", self.in_flight, "envs in flight,",
+                      self.acked, "acknowledged")
+        self.leases.setdefault(env_id, []).append(time.monotonic())
+        self.in_flight += 1
+
+    def close(self):
+        self.socket.close(linger=0)
+
+
+class NoGate:
+    """producer side stand-in if flow control is switched off"""
+
+    def acquire(self, env_id=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_gate(context, config):
+    """gate according to the producer's max-in-flight (0 = unlimited), ack-port and credit-lease-s config"""
+    max_in_flight = int(config["max-in-flight"])
+    if max_in_flight <= 0:
+        return NoGate()
+    return CreditGate(context, config["ack-port"], max_in_flight, lease_s=float(config["credit-lease-s"]))
+
+
+class AckSender:
+    """consumer side, acknowledges finished envs to the producer"""
+
+    def __init__(self, context, address):
+        self.socket = context.socket(zmq.PUSH)
+        self.socket.connect("tcp://" + address)
+
+    def ack(self, env_id):
+        self.socket.send(json.dumps({"env_id": env_id}).encode("utf-8"))
+
+    def close(self):
+        self.socket.close(linger=1000)
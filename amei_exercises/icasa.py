@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+
+import numpy as np
+import pandas
+
+
+def workbook_cache_key(path_to_xlsx, sheet_names, header):
+    """key identifying one version of a workbook (path, size, mtime) and the way it has been read"""
+    st = os.stat(path_to_xlsx)
+    key = json.dumps([str(Path(path_to_xlsx).resolve()), st.st_size, st.st_mtime_ns, list(sheet_names), header])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _store_sheets(dfs, path_to_dir):
+    tmp_dir = path_to_dir.with_name(f"{path_to_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    meta = {"sheets": {}}
+    for s_i, (sheet_name, df) in enumerate(dfs.items()):
+        columns = []
+        for c_i, col_name in enumerate(df.columns):
+            values = df[col_name].to_numpy()
+            file_name = f"s{s_i}_c{c_i}.npy"
+            if values.dtype.kind in "biufcmM":
+                # plain numeric and datetime columns can be memory-mapped later on
+                np.save(tmp_dir / file_name, values)
+                mmap = True
+            elif all(type(v) is str for v in values):
+                np.save(tmp_dir / file_name, values.astype(str))
+                mmap = True
+            else:
+                # mixed columns (e.g. text with empty cells) have to be pickled
+                np.save(tmp_dir / file_name, values, allow_pickle=True)
+                mmap = False
+            columns.append({
+                "name": col_name if isinstance(col_name, (str, int, float)) else str(col_name),
+                "file": file_name,
+                "mmap": mmap,
+            })
+        meta["sheets"][sheet_name] = {"columns": columns, "rows": len(df)}
+
+    with open(tmp_dir / "meta.json", "w") as _:
+        json.dump(meta, _)
+
+    shutil.rmtree(path_to_dir, ignore_errors=True)
+    os.replace(tmp_dir, path_to_dir)
+
+
+def _load_sheets(path_to_dir):
+    with open(path_to_dir / "meta.json") as _:
+        meta = json.load(_)
+
+    dfs = {}
+    for sheet_name, sheet in meta["sheets"].items():
+        cols = {}
+        for col in sheet["columns"]:
+            if col["mmap"]:
+                cols[col["name"]] = np.asarray(np.load(path_to_dir / col["file"], mmap_mode="r"))
+            else:
+                cols[col["name"]] = np.load(path_to_dir / col["file"], allow_pickle=True)
+        dfs[sheet_name] = pandas.DataFrame(cols, index=pandas.RangeIndex(sheet["rows"]), copy=False)
+    return dfs
+
+
+def read_excel_cached(path_to_xlsx, sheet_names, header=2, path_to_cache_dir=".icasa-cache"):
+    """read the given sheets of an ICASA workbook, the excel file is only parsed if the column cache is outdated"""
+
+    if not path_to_cache_dir:
+        return pandas.read_excel(path_to_xlsx, sheet_name=sheet_names, header=header)
+
+    stem = Path(path_to_xlsx).stem
+    cache_root = Path(path_to_cache_dir)
+    cache_dir = cache_root / f"{stem}-{workbook_cache_key(path_to_xlsx, sheet_names, header)}"
+
+    if (cache_dir / "meta.json").exists():
+        try:
+            return _load_sheets(cache_dir)
+        except (OSError, ValueError, KeyError) as e:
+            print("icasa.py: Couldn't load cached workbook from", cache_dir, "->", e, "reading excel file again")
+
+    dfs = pandas.read_excel(path_to_xlsx, sheet_name=sheet_names, header=header)
+    try:
+        _store_sheets(dfs, cache_dir)
+        # remove caches of older versions of the same workbook
+        for p in cache_root.iterdir():
+            if p != cache_dir and p.name.rsplit("-", 1)[0] == stem:
+                shutil.rmtree(p, ignore_errors=True)
+    except OSError as e:
+        print("icasa.py: Couldn't write workbook cache to", cache_dir, "->", e)
+    return dfs
+
+
+# ICASA Weather_daily column -> MONICA climate element (ACD) index and unit conversion factor
+WEATHER_DAILY_TO_ACD = [
+    ("SRAD", 8, 1.0),  # globrad MJ m-2 day-1
+    ("TMAX", 5, 1.0),  # max temp °C
+    ("TAVD", 4, 1.0),  # tavg temp °C
+    ("TMIN", 3, 1.0),  # min temp °C
+    ("RAIN", 6, 1.0),  # precip mm
+    ("WIND", 9, 1.0 / 24.0 / 3.6),  # wind km/day -> m/s
+    ("RHAVD", 12, 1.0),  # relative humidity %
+    ("VPRSD", 14, 1.0),  # kPa
+]
+
+
+def weather_daily_from_df(wdaily_df, columns=WEATHER_DAILY_TO_ACD, nan_value=None):
+    """split the Weather_daily sheet by WST_DATASET into contiguous float64 arrays per MONICA climate element,
+    missing values stay NaN unless a nan_value to fill them with is given"""
+
+    ds_ids = wdaily_df["WST_DATASET"].astype(str).to_numpy()
+    dates = wdaily_df["W_DATE"].astype(str).str[:10].to_numpy()
+
+    # convert whole columns at once, missing columns are just left out
+    acd_to_values = {}
+    for col_name, acdi, factor in columns:
+        if col_name not in wdaily_df:
+            continue
+        values = wdaily_df[col_name].to_numpy(dtype=np.float64)
+        if factor != 1.0:
+            values = values * factor
+        if nan_value is not None:
+            values = np.where(np.isnan(values), nan_value, values)
+        acd_to_values[acdi] = values
+
+    weather_daily = {}
+    for ds_id, idxs in wdaily_df.groupby(ds_ids, sort=False).indices.items():
+        ds_dates = dates[idxs]
+        weather_daily[ds_id] = {
+            "start_date": str(ds_dates[0]),
+            "end_date": str(ds_dates[-1]),
+            "dates": ds_dates,
+            "data": {acdi: values[idxs] for acdi, values in acd_to_values.items()},
+        }
+    return weather_daily
+
+
+def climate_data_window(weather_data, start_date=None, end_date=None):
+    """climateData for the days of a dataset within [start_date, end_date], both clamped to the available data"""
+
+    # the (ascending) ISO date strings of the dataset are the date -> index lookup
+    dates = weather_data["dates"]
+    start_i = 0 if start_date is None else int(np.searchsorted(dates, start_date[:10], side="left"))
+    end_i = len(dates) if end_date is None else int(np.searchsorted(dates, end_date[:10], side="right"))
+    if start_i >= end_i:
+        raise ValueError(f"No climate data between {start_date} and {end_date} "
+                         f"(available: {weather_data['start_date']} - {weather_data['end_date']})")
+
+    return {
+        "startDate": str(dates[start_i]),
+        "endDate": str(dates[end_i - 1]),
+        "data": {acdi: values[start_i:end_i].tolist() for acdi, values in weather_data["data"].items()},
+    }
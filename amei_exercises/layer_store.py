@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Store of the layered daily results (e.g. TSAV, SWLD, SNLD) of many envs in a single file:
+#   <store>/layers.f32    the days x layers x variables float32 arrays of the envs, one after the other
+#   <store>/index.jsonl   one JSON line per env with customId, variables, dates, shape and offset of its array
+# The data file is not compressed, so it can be memory mapped and a depth or date range of an env
+# read without loading (or parsing) anything else. Only one consumer (process) may append to a store.
+# Reading e.g.
+#   store = LayerStoreReader("out/layers")
+#   rec = store.find(model_code="MO", treatment_id="T1")[0]
+#   tsav_10_to_20_cm = store.array(rec)[:, 2:4, rec["variables"].index("TSAV")]
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+DATA_FILE = "layers.f32"
+INDEX_FILE = "index.jsonl"
+
+
+class LayerStore:
+    def __init__(self, path_to_store):
+        self.path_to_store = Path(path_to_store)
+        self.path_to_store.mkdir(parents=True, exist_ok=True)
+        self.envs_written = 0
+        self.bytes_written = 0
+
+    def append(self, custom_id, variables, dates, array):
+        """append the days x layers x variables array of an env"""
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        with open(self.path_to_store / DATA_FILE, "ab") as _:
+            offset = _.seek(0, os.SEEK_END)
+            _.write(array.tobytes())
+        # the index line is written after the data, so every indexed array is complete
+        rec = {"customId": custom_id, "variables": list(variables), "dates": list(dates),
+               "shape": list(array.shape), "offset": offset}
+        with open(self.path_to_store / INDEX_FILE, "a") as _:
+            _.write(json.dumps(rec) + "\n")
+        self.envs_written += 1
+        self.bytes_written += array.nbytes
+
+    def append_results(self, custom_id, results, variables, layers=None):
+        """append the layered values of the daily results (the first layers or all)"""
+        if not results:
+            return
+        layers = layers or min(len(results[0][var]) for var in variables)
+        array = np.array([[vals[var][:layers] for var in variables] for vals in results], dtype=np.float32)
+        self.append(custom_id, variables, [vals["Date"] for vals in results], array.transpose(0, 2, 1))
+
+    def summary(self):
+        return (f"layer store {self.path_to_store}: {self.envs_written} envs, "
+                f"{self.bytes_written / (1024 * 1024):.1f} MB")
+
+
+class LayerStoreReader:
+    def __init__(self, path_to_store):
+        self.path_to_store = Path(path_to_store)
+        self.records = []
+        path_to_index = self.path_to_store / INDEX_FILE
+        if path_to_index.exists():
+            with open(path_to_index) as _:
+                for line in _:
+                    if line.strip():
+                        self.records.append(json.loads(line))
+        # a store without layer results has no (or an empty) data file, which can't be memory mapped
+        path_to_data = self.path_to_store / DATA_FILE
+        if path_to_data.exists() and path_to_data.stat().st_size > 0:
+            self._data = np.memmap(path_to_data, dtype=np.float32, mode="r")
+        else:
+            self._data = np.empty(0, dtype=np.float32)
+
+    def find(self, **custom_id_values):
+        """the records of the envs whose customId has the given values"""
+        return [rec for rec in self.records
+                if all(rec["customId"].get(k) == v for k, v in custom_id_values.items())]
+
+    def array(self, rec):
+        """the memory mapped days x layers x variables array of a record"""
+        start = rec["offset"] // np.dtype(np.float32).itemsize
+        return self._data[start:start + int(np.prod(rec["shape"]))].reshape(rec["shape"])
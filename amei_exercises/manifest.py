@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Manifest of finished envs, one JSON line per env written by the consumers:
+#   {"fingerprint": ..., "run": ..., "env_id": ..., "outputs": [...], "digests": [...], "sizes": [...],
+#    "mtimes": [...], "time": ...}
+# A producer started with the same manifest=... skips all envs whose fingerprint is listed and whose output
+# files still exist unchanged, so a rerun only sends the missing or changed envs. An output is unchanged if its
+# size and modification time are the recorded ones or, if only the time differs, its sha256 digest.
+# Each line is appended with a single write and synced to disk, a line cut off by a crash is ignored.
+# The consumers skip results already listed with the same producer run and env id (duplicates) and after
+# a restart count the envs of the run listed in the manifest towards the expected number of envs.
+# Envs with the same content (fingerprint) but different env ids are different results for the consumers.
+
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import uuid
+
+
+def new_run_id():
+    """id of a producer run, sent along in the customId of all its envs"""
+    return datetime.now().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def env_key(custom_id):
+    """key of the producer's skip of done envs: the fingerprint of an env or, if the producer didn't create
+    fingerprints, its id within the producer run"""
+    if custom_id.get("fingerprint"):
+        return custom_id["fingerprint"]
+    return "{}:{}".format(custom_id.get("run", ""), custom_id["env_id"])
+
+
+def result_key(custom_id):
+    """key of a result within the producer run, used to detect duplicates"""
+    return custom_id.get("run"), custom_id["env_id"]
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as _:
+        for chunk in iter(lambda: _.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def outputs_intact(rec):
+    """True if all output files of a record exist and are unchanged"""
+    digests = rec.get("digests")
+    sizes = rec.get("sizes")
+    mtimes = rec.get("mtimes")
+    for i, path in enumerate(rec["outputs"]):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if digests is None:
+            # recorded before the digests, only the existence is known
+            continue
+        if sizes is not None and stat.st_size != sizes[i]:
+            return False
+        if mtimes is not None and stat.st_mtime_ns == mtimes[i]:
+            continue
+        if file_digest(path) != digests[i]:
+            return False
+    return True
+
+
+def _read_records(path_to_manifest):
+    if not path_to_manifest or not os.path.exists(path_to_manifest):
+        return
+    with open(path_to_manifest) as _:
+        for line in _:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut off by a crashed consumer
+                continue
+
+
+def load(path_to_manifest):
+    """env key -> latest record"""
+    return {env_key(rec): rec for rec in _read_records(path_to_manifest)}
+
+
+class Manifest:
+    def __init__(self, path_to_manifest):
+        self.path_to_manifest = path_to_manifest
+        self.records = {}
+        self.results = {}  # result key -> latest record
+        for rec in _read_records(path_to_manifest):
+            self.records[env_key(rec)] = rec
+            self.results[result_key(rec)] = rec
+
+    def is_done(self, fingerprint):
+        rec = self.records.get(fingerprint)
+        return rec is not None and outputs_intact(rec)
+
+    def is_duplicate(self, custom_id):
+        """True if the env has already been written in the same producer run"""
+        if custom_id.get("run") is None:
+            return False
+        rec = self.results.get(result_key(custom_id))
+        return rec is not None and outputs_intact(rec)
+
+    def run_count(self, run):
+        """number of envs of a producer run listed in the manifest"""
+        return len(self.run_env_ids(run))
+
+    def run_env_ids(self, run):
+        """env ids of a producer run listed in the manifest"""
+        return {env_id for run_, env_id in list(self.results) if run_ == run}
+
+    def add(self, custom_id, outputs):
+        """record a finished env, outputs are the paths of the files written for it"""
+        stats = [os.stat(path) for path in outputs]
+        rec = {
+            "fingerprint": custom_id.get("fingerprint"),
+            "run": custom_id.get("run"),
+            "env_id": custom_id["env_id"],
+            "outputs": [os.path.abspath(path) for path in outputs],
+            "digests": [file_digest(path) for path in outputs],
+            "sizes": [stat.st_size for stat in stats],
+            "mtimes": [stat.st_mtime_ns for stat in stats],
+            "time": datetime.now().isoformat(),
+        }
+        Path(self.path_to_manifest).parent.mkdir(parents=True, exist_ok=True)
+        # one write on a file opened for appending, so lines of several consumers don't interleave
+        fd = os.open(self.path_to_manifest, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(rec) + "\n").encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.records[env_key(rec)] = rec
+        self.results[result_key(rec)] = rec
@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Ordered fan-out of env construction over a process pool.
+# The producers put everything the workers need (parsed workbook, env template, ...) into a single
+# shared object handed to the pool initializer. With the fork start method (Linux) the workers
+# inherit it as a snapshot of the producer's memory, with spawn (Windows, macOS) it is pickled once per worker.
+
+from collections import deque
+import multiprocessing
+
+
+def imap_ordered(func, tasks, workers=1, initializer=None, initargs=(), max_ahead=None):
+    """yield func(task) for all tasks in task order, computed in a process pool if workers > 1,
+    at most max_ahead (default 2 * workers) results are computed in advance of the consumer of this generator"""
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(func, tasks)
+        return
+
+    max_ahead = max_ahead or 2 * workers
+    with multiprocessing.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= max_ahead:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Progress of a consumer: envs received per second, the ETA against the no_of_sent_envs of the producers
+# and the envs received per model_code, reported every progress-every-s seconds instead of every customId.
+# At a timeout the env ids sent (see resubmit) but not received are listed. With several consumers on
+# the same port give all of them the same manifest, so the envs received by the others are known too.
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+import time
+
+from amei_exercises import resubmit
+
+
+class Progress:
+    def __init__(self, report_every_s=10):
+        self.report_every_s = report_every_s
+        self.start_time = time.perf_counter()
+        self.last_report_time = self.start_time
+        self.start_done = None
+        self.model_counts = Counter()
+        self.received_ids = defaultdict(set)  # run -> env ids received by this consumer
+        self.sent_ids = {}  # run -> env ids sent by the producer (shard) of the run
+
+    def received(self, custom_id):
+        if "model_code" in custom_id:
+            self.model_counts[custom_id["model_code"]] += 1
+        self.received_ids[custom_id.get("run")].add(custom_id["env_id"])
+
+    def sent(self, run, sent_env_id_ranges):
+        """the ranges of env ids of a no_of_sent_envs message"""
+        if sent_env_id_ranges is not None:
+            self.sent_ids[run] = set(resubmit.from_ranges(sent_env_id_ranges))
+
+    def report(self, done, expected, force=False):
+        """progress line every report_every_s seconds (or None), done counts the envs received so far"""
+        now = time.perf_counter()
+        if self.start_done is None:
+            # the rate is measured from the first result on
+            self.start_time = self.last_report_time = now
+            self.start_done = done
+        if not force and now - self.last_report_time < self.report_every_s:
+            return None
+        self.last_report_time = now
+        rate = (done - self.start_done) / max(now - self.start_time, 1e-9)
+        if expected is None:
+            of, eta = "?", "?"
+        else:
+            of = "{} ({:.1f} %)".format(expected, 100.0 * done / expected if expected else 100.0)
+            eta = str(timedelta(seconds=round((expected - done) / rate))) if rate > 0 else "?"
+        line = f"progress: {done} of {of} envs, {rate:.2f} envs/s, ETA {eta}"
+        if self.model_counts:
+            per_model = ", ".join(f"{code}: {count}" for code, count in sorted(self.model_counts.items()))
+            line += ", per model_code: " + per_model
+        return line
+
+    def outstanding(self, done_envs=None):
+        """run -> sorted env ids sent but neither received nor listed in the manifest done_envs,
+        only for the runs whose no_of_sent_envs message has been seen"""
+        missing = {}
+        for run, sent_ids in self.sent_ids.items():
+            ids = sent_ids - self.received_ids.get(run, set())
+            if ids and done_envs:
+                ids -= done_envs.run_env_ids(run)
+            if ids:
+                missing[run] = sorted(ids)
+        return missing
+
+    def outstanding_summary(self, missing):
+        """lines listing the outstanding env ids as returned by outstanding"""
+        if not self.sent_ids:
+            return "outstanding envs unknown, no no_of_sent_envs message with the sent env ids received yet"
+        if not missing:
+            return "no outstanding envs"
+        return "\n".join(f"outstanding {len(ids)} envs of run {run}: env ids {resubmit.format_ranges(ids)}"
+                         for run, ids in missing.items())
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Resubmission of the envs a consumer didn't receive, e.g. because a MONICA worker crashed.
+# The no_of_sent_envs message of a producer carries the ids of all envs it sent as ranges [[first, last], ...].
+# A consumer started with resubmit-list=out/resubmit.json writes the ids still outstanding when it times out
+# and a producer started with resubmit=out/resubmit.json (and the same sweep config) sends only these envs.
+
+import json
+from pathlib import Path
+
+
+def to_ranges(ids):
+    """[[first, last], ...] of the consecutive runs of the ids"""
+    ranges = []
+    for id_ in sorted(ids):
+        if ranges and id_ == ranges[-1][1] + 1:
+            ranges[-1][1] = id_
+        else:
+            ranges.append([id_, id_])
+    return ranges
+
+
+def from_ranges(ranges):
+    for first, last in ranges:
+        yield from range(first, last + 1)
+
+
+def format_ranges(ids):
+    """e.g. 1-5,9,12-20"""
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in to_ranges(ids))
+
+
+def write_list(path_to_list, env_ids):
+    Path(path_to_list).parent.mkdir(parents=True, exist_ok=True)
+    with open(path_to_list, "w") as _:
+        json.dump({"env_ids": to_ranges(env_ids)}, _)
+
+
+def load_list(path_to_list):
+    """set of the env ids to resubmit"""
+    with open(path_to_list) as _:
+        return set(from_ranges(json.load(_)["env_ids"]))
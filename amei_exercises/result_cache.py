@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# On-disk cache of MONICA results, keyed by the env fingerprint (see fingerprint.py) and the MONICA version.
+# Consumers started with result-cache=<dir> store every result they receive, producers started with the same
+# result-cache=<dir> send a cached result directly to the consumers (the frontend of the out proxy, port 7788)
+# instead of sending the env to a MONICA worker. The cache is bounded in size, the least recently
+# used results (by file modification time) are evicted first.
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+
+class ResultCache:
+    def __init__(self, path_to_cache_dir, monica_version, max_size_mb=10000):
+        self.path_to_cache_dir = Path(path_to_cache_dir)
+        self.monica_version = monica_version
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self._size = None  # total size of the cached results, determined on the first put
+
+    def _path(self, fingerprint):
+        key = hashlib.sha256(f"{self.monica_version}:{fingerprint}".encode("utf-8")).hexdigest()
+        return self.path_to_cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, fingerprint):
+        """the cached result (JSON bytes without customId) or None"""
+        path = self._path(fingerprint)
+        try:
+            with open(path, "rb") as _:
+                result_bytes = _.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result_bytes
+
+    def put(self, fingerprint, msg):
+        """store a result message (its customId is not stored)"""
+        result_bytes = json.dumps({k: v for k, v in msg.items() if k != "customId"}).encode("utf-8")
+        path = self._path(fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp_path, "wb") as _:
+            _.write(result_bytes)
+        os.replace(tmp_path, path)
+        self.stored += 1
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(result_bytes)
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self):
+        for sub_dir in self.path_to_cache_dir.iterdir():
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def evict(self, target_fraction=0.9):
+        """remove the least recently used results until the cache is below target_fraction of its max size"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_size * target_fraction:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self.evicted += 1
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        hit_rate = f"{self.hits / lookups * 100:.1f}%" if lookups else "-"
+        return (f"result cache {self.path_to_cache_dir}: {self.hits} hits, {self.misses} misses "
+                f"(hit rate {hit_rate}), {self.stored} stored, {self.evicted} evicted")
+
+
+def cached_result_msg(result_bytes, custom_id):
+    """the result message to send to the consumers for a cache hit"""
+    prefix = b'{"customId": ' + json.dumps(custom_id).encode("utf-8") + b', "fromResultCache": true'
+    if result_bytes.strip() == b"{}":
+        return prefix + b"}"
+    return prefix + b", " + result_bytes.lstrip()[1:]
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Columnar store of the MONICA results (Parquet, needs pyarrow), instead of or next to the text files:
+#   <store>/exercise=<exercise>/section=<i>/model_code=<model_code>/part-<uuid>.parquet
+# section i holds the rows (days) of data section i (msg["data"][i]) of the results, next to the result
+# values as typed columns (float64, int64 or lists of them) come the treatment and the customId of the env.
+# The columns of a file are the union of the result keys of its rows, a key missing in a row is stored as null.
+# Rows are buffered and written in batches of flush_rows (or every flush_s seconds, so an interrupted consumer
+# only loses the results of the last seconds), so the store consists of a few large files.
+# Rows that can't be written are quarantined in <store>/quarantine/ as JSON lines and their envs aren't reported
+# as stored (so they stay outstanding in the manifest).
+# Start a consumer e.g. with result-store=out/results text-files=false and write the text files later
+# with python run-consumer.py export-from=out/results
+
+import json
+import os
+from pathlib import Path
+import time
+import uuid
+
+
+class ResultStore:
+    def __init__(self, path_to_store, exercise, flush_rows=200000, flush_s=60):
+        import pyarrow
+        import pyarrow.parquet
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path_to_store = Path(path_to_store)
+        self.exercise = exercise
+        self.flush_rows = flush_rows
+        self.flush_s = flush_s
+        self.rows_written = 0
+        self.files_written = 0
+        self.rows_failed = 0
+        self._buffers = {}  # (section, model_code) -> rows
+        self._buffered_rows = 0
+        self._on_stored = []  # (customId, on_stored)
+        self._last_flush = time.monotonic()
+
+    def append(self, msg, model_code, treatment, on_stored=None):
+        """buffer the results of msg, on_stored() is called once they are written to disk"""
+        custom_id = json.dumps(msg["customId"])
+        sections = msg.get("data", [])
+        for section, data in enumerate(sections):
+            rows = self._buffers.setdefault((section, str(model_code)), [])
+            for i, vals in enumerate(data.get("results", [])):
+                rows.append({"treatment": str(treatment), "customId": custom_id, "sections": len(sections),
+                             "row": i, **vals})
+                self._buffered_rows += 1
+        if on_stored:
+            self._on_stored.append((custom_id, on_stored))
+        if self._buffered_rows >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_s:
+            self.flush()
+
+    def flush(self):
+        failed_envs = set()
+        try:
+            for (section, model_code), rows in self._buffers.items():
+                if not rows:
+                    continue
+                try:
+                    self._write_part(section, model_code, rows)
+                except Exception as e:
+                    failed_envs.update(row["customId"] for row in rows)
+                    self._quarantine(section, model_code, rows, e)
+        finally:
+            # the buffered rows are gone either way, a failing batch must not fail every later flush again
+            self._buffers = {}
+            self._buffered_rows = 0
+            self._last_flush = time.monotonic()
+            on_stored, self._on_stored = self._on_stored, []
+        for custom_id, callback in on_stored:
+            if custom_id not in failed_envs:
+                callback()
+
+    def _write_part(self, section, model_code, rows):
+        path = self.path_to_store / f"exercise={self.exercise}" / f"section={section}" / f"model_code={model_code}"
+        path.mkdir(parents=True, exist_ok=True)
+        tmp_path = path / f".part-{uuid.uuid4().hex}.parquet.tmp"
+        try:
+            self._pq.write_table(self._table(rows), tmp_path)
+            os.replace(tmp_path, path / tmp_path.name[1:-len(".tmp")])
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.rows_written += len(rows)
+        self.files_written += 1
+
+    def _quarantine(self, section, model_code, rows, e):
+        self.rows_failed += len(rows)
+        path = self.path_to_store / "quarantine" / f"section={section}-model_code={model_code}-{uuid.uuid4().hex}.jsonl"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as _:
+                for row in rows:
+                    _.write(json.dumps(row, default=str) + "\n")
+        except Exception as qe:
+            print("result_store.py: Couldn't write", len(rows), "rows of section", section, "model_code", model_code,
+                  "->", e, "and couldn't quarantine them ->", qe)
+            return
+        print("result_store.py: Couldn't write", len(rows), "rows of section", section, "model_code", model_code,
+              "->", e, "quarantined them in", path)
+
+    def _table(self, rows):
+        """table with the union of the keys of the rows as columns, the column types are inferred from all rows"""
+        keys = {}
+        for row in rows:
+            keys.update(dict.fromkeys(row))
+        columns = {}
+        values_per_key = {}
+        for key in keys:
+            values = [row.get(key) for row in rows]
+            columns[key] = self._pa.array(values)
+            values_per_key[key] = sum(1 for value in values if value is not None)
+        table = self._pa.Table.from_pydict(columns)
+        # every value of the rows has to arrive in the table
+        if table.num_rows != len(rows) or any(table.column(key).null_count != len(rows) - count
+                                              for key, count in values_per_key.items()):
+            raise ValueError("result_store: rows don't round-trip into the table")
+        return table
+
+    def close(self):
+        self.flush()
+
+    def summary(self):
+        line = f"result store {self.path_to_store}: {self.rows_written} rows in {self.files_written} files"
+        if self.rows_failed:
+            line += f", {self.rows_failed} rows quarantined"
+        return line
+
+
+def read_messages(path_to_store, exercise):
+    """the result messages ({"customId": ..., "data": [{"results": [...]}, ...]}) stored for the exercise,
+    one model_code after the other"""
+    import pyarrow.parquet as pq
+    path = Path(path_to_store) / f"exercise={exercise}"
+    model_codes = sorted({p.name.split("=", 1)[1] for p in path.glob("section=*/model_code=*")})
+    for model_code in model_codes:
+        msgs = {}
+        for section_path in sorted(path.glob("section=*"), key=lambda p: int(p.name.split("=", 1)[1])):
+            section = int(section_path.name.split("=", 1)[1])
+            for part in sorted((section_path / f"model_code={model_code}").glob("part-*.parquet")):
+                for row in pq.read_table(part).to_pylist():
+                    custom_id = row.pop("customId")
+                    msg = msgs.get(custom_id)
+                    if msg is None:
+                        msg = msgs[custom_id] = {"customId": json.loads(custom_id),
+                                                 "data": [{"results": []} for _ in range(row["sections"])]}
+                    for key in ("treatment", "sections"):
+                        del row[key]
+                    row_index = row.pop("row")
+                    # null columns are fields of other results stored in the same file
+                    msg["data"][section]["results"].append((row_index, {k: v for k, v in row.items() if v is not None}))
+        for msg in msgs.values():
+            for data in msg["data"]:
+                data["results"] = [vals for _, vals in sorted(data["results"], key=lambda r: r[0])]
+            yield msg
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Design-of-experiments samplers on the unit hypercube for sensitivity runs:
+# latin hypercube, Sobol' sequence (with a Saltelli design for Sobol' indices) and Morris trajectories.
+# Every sampler returns a list of dicts with the unit coordinates ("x", one value per factor)
+# and the design information needed to compute the sensitivity indices from the results ("design").
+
+import numpy as np
+
+# primitive polynomials and initial direction numbers (s, a, m_1..m_s) for the dimensions 2, 3, ...
+# from S. Joe and F. Y. Kuo, new-joe-kuo-6.21201 (the first dimension uses m_k = 1)
+JOE_KUO_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+    (7, 7, (1, 1, 3, 13, 7, 35, 63)),
+    (7, 8, (1, 3, 5, 9, 1, 25, 53)),
+    (7, 14, (1, 3, 1, 13, 9, 35, 107)),
+    (7, 19, (1, 3, 1, 5, 27, 61, 31)),
+    (7, 21, (1, 1, 5, 11, 19, 41, 61)),
+    (7, 28, (1, 3, 5, 3, 3, 13, 69)),
+    (7, 31, (1, 1, 7, 13, 1, 19, 1)),
+    (7, 32, (1, 3, 7, 5, 13, 19, 59)),
+    (7, 37, (1, 1, 3, 9, 25, 29, 41)),
+    (7, 41, (1, 3, 5, 13, 23, 1, 55)),
+    (7, 42, (1, 3, 7, 3, 13, 59, 17)),
+    (7, 50, (1, 3, 1, 3, 5, 53, 69)),
+    (7, 55, (1, 1, 5, 5, 23, 33, 13)),
+    (7, 56, (1, 1, 7, 7, 1, 61, 123)),
+    (7, 59, (1, 1, 7, 9, 13, 61, 49)),
+    (7, 62, (1, 3, 3, 5, 3, 55, 33)),
+    (8, 14, (1, 3, 1, 15, 31, 13, 49, 245)),
+    (8, 21, (1, 3, 5, 15, 31, 59, 63, 97)),
+    (8, 22, (1, 3, 1, 11, 11, 11, 77, 249)),
+    (8, 38, (1, 3, 1, 11, 27, 43, 71, 9)),
+    (8, 47, (1, 1, 7, 15, 21, 11, 81, 45)),
+    (8, 49, (1, 3, 7, 3, 25, 31, 65, 79)),
+    (8, 50, (1, 3, 1, 1, 19, 11, 3, 205)),
+    (8, 52, (1, 1, 5, 9, 19, 21, 29, 157)),
+    (8, 56, (1, 3, 7, 11, 1, 33, 89, 185)),
+    (8, 67, (1, 3, 3, 3, 15, 9, 79, 71)),
+    (8, 70, (1, 3, 7, 11, 15, 39, 119, 27)),
+    (8, 84, (1, 1, 3, 1, 11, 31, 97, 225)),
+    (8, 97, (1, 1, 1, 3, 23, 43, 57, 177)),
+    (8, 103, (1, 3, 7, 7, 17, 17, 37, 71)),
+    (8, 115, (1, 3, 1, 5, 27, 63, 123, 213)),
+    (8, 122, (1, 1, 3, 5, 11, 43, 53, 133)),
+    (9, 8, (1, 3, 5, 5, 29, 17, 47, 173, 479)),
+    (9, 13, (1, 3, 3, 11, 3, 1, 109, 9, 69)),
+    (9, 16, (1, 1, 1, 5, 17, 39, 23, 5, 343)),
+    (9, 22, (1, 3, 1, 5, 25, 15, 31, 103, 499)),
+    (9, 25, (1, 1, 1, 11, 11, 17, 63, 105, 183)),
+    (9, 44, (1, 1, 5, 11, 9, 29, 97, 231, 363)),
+    (9, 47, (1, 1, 5, 15, 19, 45, 41, 7, 383)),
+    (9, 52, (1, 3, 7, 7, 31, 19, 83, 137, 221)),
+    (9, 55, (1, 1, 1, 3, 23, 15, 111, 223, 83)),
+    (9, 59, (1, 1, 5, 13, 31, 15, 55, 25, 161)),
+    (9, 62, (1, 1, 3, 13, 25, 47, 39, 87, 257)),
+]
+
+MAX_SOBOL_DIMS = len(JOE_KUO_DIRECTIONS) + 1
+SOBOL_BITS = 30
+
+
+def _direction_numbers(dim):
+    """direction numbers v_1..v_SOBOL_BITS (scaled by 2^SOBOL_BITS) of dimension dim (0 based)"""
+    v = np.zeros(SOBOL_BITS + 1, dtype=np.int64)
+    if dim == 0:
+        for k in range(1, SOBOL_BITS + 1):
+            v[k] = 1 << (SOBOL_BITS - k)
+        return v
+    s, a, m = JOE_KUO_DIRECTIONS[dim - 1]
+    for k in range(1, SOBOL_BITS + 1):
+        if k <= s:
+            v[k] = m[k - 1] << (SOBOL_BITS - k)
+        else:
+            v[k] = v[k - s] ^ (v[k - s] >> s)
+            for j in range(1, s):
+                if (a >> (s - 1 - j)) & 1:
+                    v[k] ^= v[k - j]
+    return v
+
+
+def sobol_sequence(n, dims, skip=0):
+    """the first n points (after skipping skip points) of the Sobol' sequence in dims dimensions (Gray code order)"""
+    if dims > MAX_SOBOL_DIMS:
+        raise ValueError(f"Sobol' sequence supports at most {MAX_SOBOL_DIMS} dimensions")
+    directions = [_direction_numbers(d) for d in range(dims)]
+    x = np.zeros(dims, dtype=np.int64)
+    points = np.empty((n + skip, dims))
+    for i in range(n + skip):
+        points[i] = x / float(1 << SOBOL_BITS)
+        # index of the lowest zero bit of i
+        c = 1
+        while (i >> (c - 1)) & 1:
+            c += 1
+        for d in range(dims):
+            x[d] ^= directions[d][c]
+    return points[skip:]
+
+
+def latin_hypercube(n, dims, rng):
+    """n points, every factor's range is split into n strata and each stratum is used once"""
+    u = (rng.random((n, dims)) + np.arange(n)[:, None]) / n
+    for d in range(dims):
+        u[:, d] = u[rng.permutation(n), d]
+    return u
+
+
+def lhs_samples(n, dims, seed=1):
+    rng = np.random.default_rng(seed)
+    return [{"x": x, "design": {"sampler": "lhs", "sample": i}} for i, x in enumerate(latin_hypercube(n, dims, rng))]
+
+
+def saltelli_samples(n, dims, skip=None):
+    """Saltelli design for first order and total Sobol' indices: per base sample j the rows A_j, B_j
+    and AB_j^i (A_j with factor i taken from B_j), that is n * (dims + 2) points,
+    by default the first points of the sequence are skipped up to the next power of two >= n"""
+    if 2 * dims > MAX_SOBOL_DIMS:
+        raise ValueError(f"The Saltelli design supports at most {MAX_SOBOL_DIMS // 2} factors "
+                         f"(two Sobol' dimensions per factor), got {dims}")
+    if skip is None:
+        skip = 1 << max(n - 1, 0).bit_length()
+    base = sobol_sequence(n, 2 * dims, skip=skip)
+    samples = []
+    for j, row in enumerate(base):
+        a, b = row[:dims], row[dims:]
+        samples.append({"x": a, "design": {"sampler": "sobol", "sample": j, "matrix": "A"}})
+        samples.append({"x": b, "design": {"sampler": "sobol", "sample": j, "matrix": "B"}})
+        for i in range(dims):
+            ab = a.copy()
+            ab[i] = b[i]
+            samples.append({"x": ab, "design": {"sampler": "sobol", "sample": j, "matrix": "AB", "factor": i}})
+    return samples
+
+
+def morris_samples(trajectories, dims, levels=4, seed=1):
+    """Morris one-at-a-time trajectories on a grid with levels levels per factor, dims + 1 points each"""
+    rng = np.random.default_rng(seed)
+    delta = levels / (2.0 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    start_levels = grid[grid <= 1 - delta + 1e-12]
+    samples = []
+    for r in range(trajectories):
+        x = rng.choice(start_levels, size=dims)
+        # start from the upper part of the grid for about half of the factors and step down there
+        flip = rng.random(dims) < 0.5
+        x[flip] += delta
+        samples.append({"x": x.copy(), "design": {"sampler": "morris", "trajectory": r, "step": 0}})
+        for step, i in enumerate(rng.permutation(dims), start=1):
+            x[i] += -delta if flip[i] else delta
+            samples.append({"x": x.copy(), "design": {"sampler": "morris", "trajectory": r, "step": step,
+                                                      "factor": int(i), "delta": -delta if flip[i] else delta}})
+    return samples
+
+
+def parse_factors(spec):
+    """{name: (low, high)} of e.g. "LAI=0:7;AWC=0:1" """
+    factors = {}
+    for factor in spec.split(";"):
+        if not factor.strip():
+            continue
+        name, bounds = factor.split("=", 1)
+        low, high = map(float, bounds.split(":"))
+        factors[name.strip()] = (low, high)
+    return factors
+
+
+def create_samples(sampler, factors, n, seed=1, morris_levels=4):
+    """the samples of a sampler (lhs, sobol or morris) for factors {name: (low, high)} with
+    "factors" ({name: value}) scaled to the factor ranges, n is the number of samples (lhs),
+    base samples (sobol) or trajectories (morris)"""
+    names = list(factors.keys())
+    dims = len(names)
+    if sampler == "lhs":
+        samples = lhs_samples(n, dims, seed=seed)
+    elif sampler == "sobol":
+        samples = saltelli_samples(n, dims)
+    elif sampler == "morris":
+        samples = morris_samples(n, dims, levels=morris_levels, seed=seed)
+    else:
+        raise ValueError(f"Unknown sampler '{sampler}', choose one of lhs, sobol or morris")
+    for s in samples:
+        s["factors"] = {name: float(low + x * (high - low)) for name, (low, high), x in zip(names, factors.values(), s["x"])}
+        if "factor" in s["design"]:
+            s["design"]["factor"] = names[s["design"]["factor"]]
+        s["design"]["id"] = sample_id(s["design"])
+        del s["x"]
+    return samples
+
+
+def sample_id(design):
+    """short name of a sample, e.g. to be used in file names"""
+    if design["sampler"] == "sobol":
+        return f"sobol{design['sample']:05d}{design['matrix']}{design.get('factor', '')}"
+    if design["sampler"] == "morris":
+        return f"morris{design['trajectory']:04d}s{design['step']:02d}"
+    return f"{design['sampler']}{design['sample']:05d}"
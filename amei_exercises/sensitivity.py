@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# online sensitivity indices of the sampled envs (see samplers.py)
+#
+# results can arrive in any order, so the rows of a Saltelli base sample (A, B, AB_i) or the
+# steps of a Morris trajectory are kept until the group is complete, then the index sums are
+# updated and the rows dropped. Only the per env summaries of the outputs are kept, never the
+# daily values.
+
+from collections import defaultdict
+import csv
+import math
+
+
+class RunningStats:
+    """Welford's online mean and variance"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        """population variance"""
+        return self._m2 / self.n if self.n else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.n > 1 else math.nan
+
+
+def summarize(results, variables):
+    """{(name, layer, statistic): value} with the mean and amplitude (max - min) over the days of
+    the results of the variables {name: result key}, layer is 0 for scalar values and 1.. for lists"""
+    columns = {}
+    for vals in results:
+        for name, key in variables.items():
+            value = vals.get(key)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                for layer, v in enumerate(value, start=1):
+                    columns.setdefault((name, layer), []).append(v)
+            else:
+                columns.setdefault((name, 0), []).append(value)
+    summary = {}
+    for (name, layer), values in columns.items():
+        summary[(name, layer, "mean")] = sum(values) / len(values)
+        summary[(name, layer, "amplitude")] = max(values) - min(values)
+    return summary
+
+
+class SobolIndices:
+    """first order (Saltelli 2010) and total (Jansen) indices of a Saltelli design"""
+
+    columns = ("S1", "ST", "n")
+
+    def __init__(self):
+        self._pending = {}
+        self._variance = defaultdict(RunningStats)
+        self._sums = defaultdict(lambda: [0.0, 0.0, 0])
+
+    def add(self, group, design, factors, outputs):
+        """add the outputs {key: value} of the sampled env, group are the fixed (not sampled) parts"""
+        rows = self._pending.setdefault((group, design["sample"]), {})
+        rows[(design["matrix"], design.get("factor"))] = outputs
+        if len(rows) < len(factors) + 2:
+            return
+        del self._pending[(group, design["sample"])]
+        a, b = rows[("A", None)], rows[("B", None)]
+        for key, f_a in a.items():
+            f_b = b.get(key)
+            if f_b is None:
+                continue
+            self._variance[(group, key)].add(f_a)
+            self._variance[(group, key)].add(f_b)
+            for factor in factors:
+                f_ab = rows[("AB", factor)].get(key)
+                if f_ab is None:
+                    continue
+                sums = self._sums[(group, key, factor)]
+                sums[0] += f_b * (f_ab - f_a)
+                sums[1] += (f_a - f_ab) ** 2
+                sums[2] += 1
+
+    def indices(self):
+        """{(group, key, factor): (S1, ST, n)}"""
+        indices = {}
+        for (group, key, factor), (s1, st, n) in self._sums.items():
+            variance = self._variance[(group, key)].variance
+            if variance > 0:
+                indices[(group, key, factor)] = (s1 / n / variance, st / (2 * n) / variance, n)
+            else:
+                indices[(group, key, factor)] = (math.nan, math.nan, n)
+        return indices
+
+    @property
+    def incomplete(self):
+        return len(self._pending)
+
+
+class MorrisIndices:
+    """mu, mu* and sigma of the elementary effects of Morris trajectories"""
+
+    columns = ("mu", "mu_star", "sigma", "n")
+
+    def __init__(self):
+        self._pending = {}
+        self._effects = defaultdict(RunningStats)
+        self._abs_effects = defaultdict(RunningStats)
+
+    def add(self, group, design, factors, outputs):
+        """add the outputs {key: value} of the sampled env, group are the fixed (not sampled) parts"""
+        steps = self._pending.setdefault((group, design["trajectory"]), {})
+        steps[design["step"]] = (design, outputs)
+        if len(steps) < len(factors) + 1:
+            return
+        del self._pending[(group, design["trajectory"])]
+        for step in range(1, len(factors) + 1):
+            step_design, y = steps[step]
+            _, y_prev = steps[step - 1]
+            for key, value in y.items():
+                if key not in y_prev:
+                    continue
+                effect = (value - y_prev[key]) / step_design["delta"]
+                self._effects[(group, key, step_design["factor"])].add(effect)
+                self._abs_effects[(group, key, step_design["factor"])].add(abs(effect))
+
+    def indices(self):
+        """{(group, key, factor): (mu, mu*, sigma, n)}"""
+        return {k: (effects.mean, self._abs_effects[k].mean, effects.std, effects.n)
+                for k, effects in self._effects.items()}
+
+    @property
+    def incomplete(self):
+        return len(self._pending)
+
+
+def create_indices(sampler):
+    """the online indices for the samples of a sampler, None if the design has none (lhs)"""
+    if sampler == "sobol":
+        return SobolIndices()
+    if sampler == "morris":
+        return MorrisIndices()
+    return None
+
+
+def write_csv(path, indices, group_names, key_names):
+    """write the indices (see create_indices) with one row per group, output key and factor"""
+    with open(path, "w", newline="") as _:
+        writer = csv.writer(_)
+        writer.writerow([*group_names, *key_names, "factor", *indices.columns])
+        for (group, key, factor), values in sorted(indices.indices().items()):
+            writer.writerow([*group, *key, factor, *("na" if isinstance(v, float) and math.isnan(v) else v
+                                                     for v in values)])
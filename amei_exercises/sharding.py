@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Deterministic partitioning of the envs of a producer run, e.g. over several submit hosts:
+#   python run-producer.py shard=0/3   (and shard=1/3, shard=2/3 on the other hosts)
+# An env belongs to the shard given by a hash of its customId (without env_id, fingerprint, run and job), so the
+# partition doesn't depend on the order of the inputs. The end-of-run message carries the shard, so a consumer
+# collecting the results of several shards can be started with expected-shards=n.
+
+import json
+import zlib
+
+IGNORED_KEYS = ("env_id", "fingerprint", "run", "job")
+
+
+def parse_shard(spec):
+    """(index, count) of a shard spec "i/n" with 0 <= i < n, an empty spec means a single shard"""
+    if not spec:
+        return 0, 1
+    index, count = map(int, str(spec).split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', expected i/n with 0 <= i < n")
+    return index, count
+
+
+def shard_of(custom_id, count):
+    key = {k: v for k, v in custom_id.items() if k not in IGNORED_KEYS}
+    return zlib.crc32(json.dumps(key, sort_keys=True, separators=(",", ":")).encode("utf-8")) % count
+
+
+def in_shard(custom_id, shard):
+    index, count = shard
+    return count == 1 or shard_of(custom_id, count) == index
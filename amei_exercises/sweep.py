@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Declarative sweeps over the scenario space of a producer.
+# A sweep is a list of axes, every axis value is a dict (the delta it contributes to a point of the sweep).
+# The points are the merged deltas of the lazily enumerated cartesian product of the axes, e.g.
+#   axes = [axis("treatment", [{"t_id": "1"}, {"t_id": "2"}]),
+#           axis("plot", lambda point: [{"p_id": p_id} for p_id in plots_of[point["t_id"]]]),
+#           axis("model", [{"st_model": "internal", "model_code": "iMO"}, ...])]
+#   for env_id, point in numbered(points(axes, order=["model"]), where=parse_filter("model_code=MO|iMO")):
+#       ...
+# Producers expose the order and filter as sweep-order=model,treatment and sweep-filter="model_code=MO|iMO;t_id=1".
+
+OVERRIDES = "overrides"
+
+
+def axis(name, values):
+    """an axis of a sweep, values is a (re-iterable) sequence of dicts or, for an axis depending on
+    outer axes, a function getting the point built so far and returning the sequence of dicts"""
+    return name, values
+
+
+def override_axis(name, path, values):
+    """an axis setting the env value at path (e.g. ("params", "userEnvironmentParameters", "Albedo"))"""
+    return axis(name, [{name: value, OVERRIDES: {tuple(path): value}} for value in values])
+
+
+def _merge(point, delta):
+    merged = {**point, **delta}
+    if OVERRIDES in point and OVERRIDES in delta:
+        merged[OVERRIDES] = {**point[OVERRIDES], **delta[OVERRIDES]}
+    return merged
+
+
+def points(axes, order=None):
+    """lazily yield the points of the cartesian product of the axes,
+    order lists axis names from the outermost to the innermost axis, the others follow in declaration order"""
+    if order:
+        axes_by_name = dict(axes)
+        unknown = [name for name in order if name not in axes_by_name]
+        if unknown:
+            raise ValueError(f"Unknown sweep axes {unknown}, choose from {list(axes_by_name.keys())}")
+        axes = [(name, axes_by_name[name]) for name in order] + [a for a in axes if a[0] not in order]
+
+    def product(i, point):
+        if i == len(axes):
+            yield point
+            return
+        name, values = axes[i]
+        for delta in values(point) if callable(values) else values:
+            yield from product(i + 1, _merge(point, delta))
+
+    yield from product(0, {})
+
+
+def numbered(points_, where=None, start=1, numbers=None):
+    """yield (number, point) for the points accepted by where (and with a number in numbers, if given),
+    the numbers count all points, so they don't change if the filter changes"""
+    for number, point in enumerate(points_, start=start):
+        if (where is None or where(point)) and (numbers is None or number in numbers):
+            yield number, point
+
+
+def group_consecutive(numbered_points, keys):
+    """yield lists of consecutive (number, point) with the same values for keys"""
+    group = []
+    group_key = None
+    for number, point in numbered_points:
+        key = tuple(point.get(k) for k in keys)
+        if group and key != group_key:
+            yield group
+            group = []
+        group_key = key
+        group.append((number, point))
+    if group:
+        yield group
+
+
+def apply_overrides(env, point):
+    for path, value in point.get(OVERRIDES, {}).items():
+        parent = env
+        for key in path[:-1]:
+            parent = parent[key]
+        parent[path[-1]] = value
+
+
+def parse_order(spec):
+    """axis names of e.g. "model,treatment" or None"""
+    return [name.strip() for name in spec.split(",") if name.strip()] if spec else None
+
+
+def parse_filter(spec):
+    """predicate on points for e.g. "model_code=MO|iMO;t_id=1" (all conditions have to match), or None"""
+    if not spec:
+        return None
+    conditions = []
+    for condition in spec.split(";"):
+        if not condition.strip():
+            continue
+        key, values = condition.split("=", 1)
+        conditions.append((key.strip(), set(v.strip() for v in values.split("|"))))
+
+    def where(point):
+        return all(str(point.get(key)) in values for key, values in conditions)
+
+    return where
+
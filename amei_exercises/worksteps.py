@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Compile the worksteps of a treatment from the sowing and harvest anchors and date sorted event streams
+# (fertilization, irrigation, ...) in a single linear merge. The result is a new list, the inputs are not touched.
+
+import heapq
+
+
+def _date(workstep):
+    return workstep["date"]
+
+
+def compile_worksteps(sowing, harvest, *event_streams):
+    """worksteps ordered by date: events before the sowing date first, then sowing,
+    the events up to the harvest date, harvest and the events after the harvest date,
+    each event stream has to be sorted by date already, events at the same date keep the order of the streams"""
+    before_sowing = []
+    in_season = []
+    after_harvest = []
+    for ws in heapq.merge(*event_streams, key=_date):
+        if ws["date"] < sowing["date"]:
+            before_sowing.append(ws)
+        elif ws["date"] > harvest["date"]:
+            after_harvest.append(ws)
+        else:
+            in_season.append(ws)
+    return before_sowing + [sowing] + in_season + [harvest] + after_harvest
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+
+# Writes the received results in a pool of threads, so the receive loop of a consumer keeps draining
+# its socket while the files are written to a slow disk or network file system.
+# write(msg) writes the files of a result and returns what written(msg, outputs) needs to record it,
+# written is called under a lock (e.g. manifest and acknowledgement, zmq sockets are not thread safe),
+# as is failed(msg, exception) for a result whose writing raised an exception.
+# Start e.g. python run-consumer.py writer-threads=4 writer-queue=64
+
+import queue
+import threading
+import time
+
+
+class WriterPool:
+    """submit only blocks while max_queued results wait to be written, threads=0 writes in the calling thread"""
+
+    def __init__(self, write, written=None, threads=2, max_queued=64, report_every_s=60, failed=None):
+        self.write = write
+        self.written = written
+        self.on_failed = failed
+        self.threads = threads
+        self.report_every_s = report_every_s
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+        self.write_s = 0.0
+        self.blocked_s = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._start = self._last_report = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, name=f"writer-{i}", daemon=True) for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def _write(self, msg):
+        start = time.perf_counter()
+        try:
+            outputs = self.write(msg)
+            with self._lock:
+                if self.written:
+                    self.written(msg, outputs)
+                self.done += 1
+                self.write_s += time.perf_counter() - start
+        except Exception as e:
+            print("writer_pool: Exception:", e)
+            with self._lock:
+                self.failed += 1
+                if self.on_failed:
+                    self.on_failed(msg, e)
+
+    def _run(self):
+        while True:
+            msg = self._queue.get()
+            try:
+                if msg is None:
+                    return
+                self._write(msg)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, msg):
+        """write the result msg (now if there are no threads)"""
+        self.submitted += 1
+        if not self._threads:
+            self._write(msg)
+        else:
+            start = time.perf_counter()
+            self._queue.put(msg)
+            self.blocked_s += time.perf_counter() - start
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        if self.report_every_s and time.perf_counter() - self._last_report > self.report_every_s:
+            self._last_report = time.perf_counter()
+            print(self.summary())
+
+    def close(self):
+        """wait until all submitted results are written"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def summary(self):
+        elapsed = time.perf_counter() - self._start
+        per_result_ms = f"{self.write_s / self.done * 1000:.0f}" if self.done else "-"
+        return (f"writer pool ({self.threads} threads): {self.done} of {self.submitted} written, "
+                f"{self.failed} failed, queue depth {self._queue.qsize()} (max {self.max_depth}), "
+                f"{self.done / elapsed:.1f} results/s, {per_result_ms} ms per result, "
+                f"receive loop blocked {self.blocked_s:.1f} s")
+
+
+def create_writer(write, written, config, failed=None):
+    """pool according to the consumer's writer-threads (0 = write in the receive loop) and writer-queue config"""
+    return WriterPool(write, written, threads=int(config["writer-threads"]), max_queued=int(config["writer-queue"]),
+                      failed=failed)
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- coding: UTF-8
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/. */
+
+# Authors:
+# Michael Berg-Mohnicke <michael.berg@zalf.de>
+#
+# Maintainers:
+# Currently maintained by the authors.
+#
+# This file has been created at the Institute of
+# Landscape Systems Analysis at the ZALF.
+# Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
+
+# Binary store for the tab separated .WTH files of the soil temperature sensitivity analysis.
+# Every dataset becomes a directory with one .npy file per variable plus the date index,
+# the producer sends the columns as climateData (mapped via the header-to-acd-names of sim.json).
+# Convert all files at once from the repository root with
+#   python -m amei_exercises.wth_store
+# or let the producer convert them on demand (climate-store=...).
+
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+
+import numpy as np
+import pandas
+from zalfmas_common import common
+
+
+# MONICA climate element (ACD) names -> indices, as used in the keys of climateData["data"]
+ACD_INDICES = {
+    "tmin": 3, "tavg": 4, "tmax": 5, "precip": 6, "globrad": 8, "wind": 9, "sunhours": 10, "cloudamount": 11,
+    "relhumid": 12, "airpress": 13, "vaporpress": 14, "co2": 15, "o3": 16, "et0": 17, "dewpointTemp": 18,
+    "specificHumidity": 19, "snowfallFlux": 20, "surfaceDownwellingLongwaveRadiation": 21,
+    "x1": 24, "x2": 25, "x3": 26, "x4": 27, "x5": 28, "x6": 29, "daylength": 34,
+}
+
+
+def header_to_acd_indices(header_to_acd_names):
+    """column name -> ACD index from the header-to-acd-names of the climate.csv-options, date columns are left out"""
+    col_to_acdi = {}
+    for col_name, acd_name in header_to_acd_names.items():
+        if not isinstance(acd_name, str):  # e.g. ["pattern-date", "YYYYDOY"], the dates come from the date index
+            continue
+        if acd_name not in ACD_INDICES:
+            raise ValueError(f"wth_store.py: unknown climate element {acd_name} for column {col_name}")
+        col_to_acdi[col_name] = ACD_INDICES[acd_name]
+    return col_to_acdi
+
+
+def convert_wth_file(path_to_wth, path_to_dataset_dir):
+    """convert a single .WTH file into a directory of .npy arrays"""
+    df = pandas.read_csv(path_to_wth, sep="\t")
+    doy_dates = df["DATE"].to_numpy(dtype=np.int64)  # YYYYDOY
+    dates = (np.array(doy_dates // 1000 - 1970, dtype="datetime64[Y]").astype("datetime64[D]")
+             + (doy_dates % 1000 - 1).astype("timedelta64[D]"))
+
+    path_to_dataset_dir = Path(path_to_dataset_dir)
+    tmp_dir = path_to_dataset_dir.with_name(f"{path_to_dataset_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    np.save(tmp_dir / "dates.npy", dates)
+    for col_name in df.columns:
+        np.save(tmp_dir / f"{col_name}.npy", df[col_name].to_numpy(dtype=np.int64 if col_name == "DATE" else np.float64))
+    with open(tmp_dir / "header.json", "w") as _:
+        json.dump({"columns": list(df.columns), "source": str(path_to_wth)}, _)
+
+    shutil.rmtree(path_to_dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, path_to_dataset_dir)
+
+
+def convert_wth_dir(path_to_wth_dir, path_to_store_dir, only_outdated=True):
+    """convert all .WTH files of a directory, returns the number of converted files"""
+    count = 0
+    for path_to_wth in sorted(Path(path_to_wth_dir).glob("*.WTH")):
+        path_to_dataset_dir = Path(path_to_store_dir) / path_to_wth.stem
+        if only_outdated and not is_outdated(path_to_wth, path_to_dataset_dir):
+            continue
+        convert_wth_file(path_to_wth, path_to_dataset_dir)
+        count += 1
+    return count
+
+
+def is_outdated(path_to_wth, path_to_dataset_dir):
+    path_to_header = Path(path_to_dataset_dir) / "header.json"
+    return not path_to_header.exists() or path_to_header.stat().st_mtime < Path(path_to_wth).stat().st_mtime
+
+
+class WthStore:
+    """memory-mapped access to the converted datasets with a small LRU of decoded datasets"""
+
+    def __init__(self, path_to_store_dir, path_to_wth_dir=None, cache_size=8):
+        self.path_to_store_dir = Path(path_to_store_dir)
+        # if the directory with the .WTH files is known, missing or outdated datasets are converted on demand
+        self.path_to_wth_dir = Path(path_to_wth_dir) if path_to_wth_dir else None
+        self.cache_size = cache_size
+        self._datasets = OrderedDict()
+        self._climate_data = OrderedDict()
+
+    def _lru_get(self, cache, key, create):
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = create(key)
+        cache[key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def _load(self, dataset):
+        path_to_dataset_dir = self.path_to_store_dir / dataset
+        if self.path_to_wth_dir:
+            path_to_wth = self.path_to_wth_dir / f"{dataset}.WTH"
+            if path_to_wth.exists() and is_outdated(path_to_wth, path_to_dataset_dir):
+                convert_wth_file(path_to_wth, path_to_dataset_dir)
+        with open(path_to_dataset_dir / "header.json") as _:
+            header = json.load(_)
+        return {
+            "dates": np.load(path_to_dataset_dir / "dates.npy", mmap_mode="r"),
+            "columns": {col_name: np.load(path_to_dataset_dir / f"{col_name}.npy", mmap_mode="r")
+                        for col_name in header["columns"]},
+        }
+
+    def load(self, dataset):
+        """dict with the "dates" and the "columns" (name -> array, in .WTH order) of a dataset"""
+        return self._lru_get(self._datasets, dataset, self._load)
+
+    def _to_climate_data(self, key):
+        dataset, col_to_acdi, start_date, end_date = key
+        ds = self.load(dataset)
+        dates = ds["dates"]
+        start_i = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(start_date[:10]), side="left"))
+        end_i = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(end_date[:10]), side="right"))
+        if start_i >= end_i:
+            raise ValueError(f"No climate data in {dataset} between {start_date} and {end_date}")
+        return {
+            "startDate": str(dates[start_i]),
+            "endDate": str(dates[end_i - 1]),
+            "data": {acdi: ds["columns"][col_name][start_i:end_i].tolist() for col_name, acdi in col_to_acdi},
+        }
+
+    def climate_data(self, dataset, col_to_acdi, start_date=None, end_date=None):
+        """climateData of the dataset within [start_date, end_date] (ISO dates, clamped to the date index),
+        col_to_acdi maps the columns to send to their ACD index (see header_to_acd_indices)"""
+        key = (dataset, tuple(col_to_acdi.items()), start_date, end_date)
+        return self._lru_get(self._climate_data, key, self._to_climate_data)
+
+
+def main():
+    config = {
+        "path-to-wth-dir": "soil_temperature_sensitivity_analysis/input_data/WeatherData",
+        "path-to-store": "soil_temperature_sensitivity_analysis/input_data/WeatherStore",
+        "only-outdated": True,
+    }
+    common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
+    count = convert_wth_dir(config["path-to-wth-dir"], config["path-to-store"], only_outdated=config["only-outdated"])
+    print("converted", count, ".WTH files into", config["path-to-store"])
+
+
+if __name__ == "__main__":
+    main()
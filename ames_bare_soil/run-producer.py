@@ -16,6 +16,7 @@
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
 from collections import defaultdict
+import hashlib
 from datetime import date, timedelta, datetime
 import json
 import numpy as np
@@ -28,6 +29,11 @@ import zmq
 from zalfmas_common import common
 from zalfmas_common.model import monica_io
 
+# make the shared amei_exercises package importable when started from within the exercise folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from amei_exercises import (climate_store, codec, fingerprint, flow_control, icasa, manifest, parallel,
+                            result_cache, resubmit, sharding, sweep)
+
 PATHS = {
     # adjust the local path to your environment
     "mbm-local-local": {
@@ -49,6 +55,93 @@ PATHS = {
 }
 
 
+SOIL_TEMP_MODELS = [
+    ("internal", "iMO"),
+    ("Monica_SoilTemp", "MO"),
+    ("DSSAT_ST_standalone", "DS"),
+    ("DSSAT_EPICST_standalone", "DE"),
+    ("Simplace_Soil_Temperature", "SA"),
+    ("Stics_soil_temperature", "ST"),
+    ("SQ_Soil_Temperature", "SQ"),
+    ("BiomaSurfacePartonSoilSWATC", "PS"),
+    ("BiomaSurfaceSWATSoilSWATC", "SW"),
+    ("ApsimCampbell", "AP"),
+]
+
+# data shared by all env building tasks of a process, set by init_env_builder
+_shared = {}
+
+
+def init_env_builder(shared):
+    _shared.update(shared)
+
+
+def create_plot_envs(task):
+    """build the envs of the sweep points of a plot (the soil temperature models),
+    returns the (hash, bytes) of the climate data if sent by reference, the (customId, frames) of the envs to send,
+    the number of envs skipped because they are done already and the setup time"""
+    e_id, t_id, p_id = (task[0][1][k] for k in ("e_id", "t_id", "p_id"))
+    t = _shared["experiments"][e_id]["treatments"][t_id]
+    p = t["plots"][p_id]
+    env_template = _shared["env_template"]
+    wire_codec = codec.get_codec(_shared["codec"])
+
+    start_setup_time = time.perf_counter()
+
+    env_template["params"]["siteParameters"]["SoilProfileParameters"] = list(map(lambda k_v: k_v[1], p["soil"]["layers"].items()))
+    env_template["params"]["siteParameters"]["Latitude"] = float(t["field"]["FL_LAT"])
+    env_template["params"]["userEnvironmentParameters"]["Albedo"] = float(p["soil"]["SALB"])
+
+    climate_data = {
+        **icasa.climate_data_window(t["weather_data"], t["SDAT"], t["ENDAT"]),
+        "tamp": t["weather_station"]["TAMP"],
+        "tav": t["weather_station"]["TAV"],
+    }
+    climate = None
+    if _shared["climate-by-ref"]:
+        climate_bytes = climate_store.encode_climate_data(climate_data)
+        climate = (hashlib.sha256(climate_bytes).hexdigest(), climate_bytes)
+        env_template["climateDataRef"] = climate[0]
+    else:
+        env_template["climateData"] = climate_data
+
+    # the fingerprints of the envs of a plot only differ in the soil temperature model
+    base_fingerprint = None
+    if _shared["fingerprints"]:
+        base_fingerprint = fingerprint.env_fingerprint(env_template, [("customId",),
+                                                                      ("params", "simulationParameters", "SoilTempModel")])
+
+    # only the soil temperature model and the customId differ between the envs of a plot,
+    # so the env is encoded once and just these two values are spliced in per env
+    env_splicer = codec.EnvSplicer(env_template, [("params", "simulationParameters", "SoilTempModel"),
+                                                  ("customId",)], wire_codec)
+    envs = []
+    skipped_count = 0
+    for env_id, point in task:
+        st_model, model_code = point["st_model"], point["model_code"]
+        custom_id = {
+            "env_id": env_id,
+            "st_model": st_model,
+            "model_code": model_code,
+            "year": t["weather_data"]["start_date"][:4],
+            "wst_dataset": t["WST_DATASET"],
+            "soil_profile_id": p["SOIL_ID"],
+            "run": _shared["run"],
+        }
+        if _shared["job"]:
+            custom_id["job"] = _shared["job"]
+        if not sharding.in_shard(custom_id, _shared["shard"]):
+            continue
+        if base_fingerprint:
+            custom_id["fingerprint"] = fingerprint.combine(base_fingerprint, st_model)
+            if custom_id["fingerprint"] in _shared["done-fingerprints"]:
+                skipped_count += 1
+                continue
+        envs.append((custom_id, env_splicer.encode_frames(st_model, custom_id)))
+
+    return climate if envs else None, envs, skipped_count, time.perf_counter() - start_setup_time
+
+
 def run_producer(server=None, port=None):
     context = zmq.Context()
     socket = context.socket(zmq.PUSH)  # pylint: disable=no-member
@@ -60,33 +153,51 @@ def run_producer(server=None, port=None):
         "sim.json": "sim.json",
         "crop.json": "crop.json",
         "site.json": "site.json",
+        "codec": "json",  # wire codec for the envs: json, orjson or msgpack (msgpack only towards climate_resolver)
+        "workbook-cache-dir": ".icasa-cache",  # empty -> always parse the excel workbook
+        "climate-by-ref": False,  # send climate data once and reference it by hash (needs climate_resolver)
+        "workers": "1",  # number of processes building the envs
+        "max-in-flight": "0",  # max number of envs not yet acknowledged by the consumers (ack-to=...), 0 = unlimited
+        "ack-port": "7780",
+        "credit-lease-s": "600",  # release the credit of an env not acknowledged within this time (lost on the way)
+        "manifest": "",  # e.g. out/manifest.jsonl (as written by the consumers) -> skip the envs already done
+        "job": "",  # id of the job, sent along in the customIds (consumers with shared-counter and the same job=)
+        "result-cache": "",  # directory shared with the consumers -> send cached results directly to the consumers
+        "monica-version": "3.6.36",  # part of the result cache key
+        "result-server-port": "7788",  # frontend of the out proxy (on server) the MONICA workers send their results to
+        "shard": "",  # i/n -> send only the i-th (0 based) of n deterministic partitions of the envs
+        "sweep-order": "",  # axes from outermost to innermost, e.g. model,experiment,treatment,plot
+        "sweep-filter": "",  # e.g. model_code=MO|iMO;t_id=1 -> only these envs
+        "resubmit": "",  # e.g. out/resubmit.json (as written by a consumer with resubmit-list=...) -> send only these envs
     }
 
     common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
 
+    wire_codec = codec.get_codec(config["codec"])
+
     # select paths
     paths = PATHS[config["mode"]]
     # connect to monica proxy (if local, it will try to connect to a locally started monica)
     socket.connect("tcp://" + config["server"] + ":" + str(config["server-port"]))
 
     # read data from excel
-    dfs = pandas.read_excel("AMEI_fallow_Ames_2024-05-16.xlsx",
-                            sheet_name=[
-                                "Experiment_description",
-                                "Fields",
-                                "Treatments",
-                                "Plots",
-                                "Residue",
-                                "initial_condition_layers",
-                                "Planting_events",
-                                "Harvest_events",
-                                "Soil_metadata",
-                                "Soil_profile_layers",
-                                "Weather_stations",
-                                "Weather_daily",
-                            ],
-                            header=2,
-                            )
+    dfs = icasa.read_excel_cached("AMEI_fallow_Ames_2024-05-16.xlsx",
+                                  [
+                                      "Experiment_description",
+                                      "Fields",
+                                      "Treatments",
+                                      "Plots",
+                                      "Residue",
+                                      "initial_condition_layers",
+                                      "Planting_events",
+                                      "Harvest_events",
+                                      "Soil_metadata",
+                                      "Soil_profile_layers",
+                                      "Weather_stations",
+                                      "Weather_daily",
+                                  ],
+                                  header=2,
+                                  path_to_cache_dir=config["workbook-cache-dir"])
 
     # load weather data
     wstations_df = dfs["Weather_stations"]
@@ -103,26 +214,7 @@ def run_producer(server=None, port=None):
             "CO2Y": float(wstations_df["CO2Y"][i]),
         }
 
-    wdaily_df = dfs["Weather_daily"]
-    weather_daily = defaultdict(lambda: {
-        "start_date": None,
-        "end_date": None,
-        "dates": [],
-        "data": defaultdict(list)
-    })
-    for i in wdaily_df.axes[0]:
-        ds_id = str(wdaily_df["WST_DATASET"][i])
-        weather_daily[ds_id]["dates"].append(str(wdaily_df["W_DATE"][i])[:10])
-        weather_daily[ds_id]["data"][8].append(float(wdaily_df["SRAD"][i]))  # globrad MJ m-2 day-1
-        weather_daily[ds_id]["data"][5].append(float(wdaily_df["TMAX"][i]))  # max temp °C
-        weather_daily[ds_id]["data"][4].append(float(wdaily_df["TAVD"][i]))  # tavg temp °C
-        weather_daily[ds_id]["data"][3].append(float(wdaily_df["TMIN"][i]))  # min temp °C
-        weather_daily[ds_id]["data"][6].append(float(wdaily_df["RAIN"][i]))  # precip mm
-        weather_daily[ds_id]["data"][14].append(float(wdaily_df["VPRSD"][i]))  # kPa
-        weather_daily[ds_id]["data"][9].append(float(wdaily_df["WIND"][i]) / 24 / 3.6)  # wind km/day -> m/s
-    for ds_id, data in weather_daily.items():
-        data["start_date"] = data["dates"][0]
-        data["end_date"] = data["dates"][-1]
+    weather_daily = icasa.weather_daily_from_df(dfs["Weather_daily"])
 
     # load soil data
     soils = defaultdict(dict)
@@ -307,67 +399,107 @@ def run_producer(server=None, port=None):
         "climate": ""
     })
 
+    climate_publisher = climate_store.ClimatePublisher(socket) if config["climate-by-ref"] else None
+
+    def treatments_of(point):
+        return experiments[point["e_id"]]["treatments"]
+
+    sweep_axes = [
+        sweep.axis("experiment", [{"e_id": e_id} for e_id in experiments.keys()]),
+        sweep.axis("treatment", lambda point: [{"t_id": t_id} for t_id in treatments_of(point).keys()]),
+        sweep.axis("plot", lambda point: [{"p_id": p_id} for p_id in treatments_of(point)[point["t_id"]]["plots"].keys()]),
+        sweep.axis("model", [{"st_model": st_model, "model_code": model_code}
+                             for st_model, model_code in SOIL_TEMP_MODELS]),
+    ]
+    # the env ids are numbered along the sweep, so they don't depend on the order the workers finish,
+    # consecutive points of the same plot form one task
+    sweep_points = sweep.points(sweep_axes, order=sweep.parse_order(config["sweep-order"]))
+    resubmit_ids = resubmit.load_list(config["resubmit"]) if config["resubmit"] else None
+    tasks = sweep.group_consecutive(sweep.numbered(sweep_points, where=sweep.parse_filter(config["sweep-filter"]),
+                                                   numbers=resubmit_ids),
+                                    ("e_id", "t_id", "p_id"))
+
+    shared = {
+        "experiments": experiments,
+        "env_template": env_template,
+        "codec": config["codec"],
+        "climate-by-ref": config["climate-by-ref"],
+        "shard": sharding.parse_shard(config["shard"]),
+        "fingerprints": bool(config["manifest"] or config["result-cache"]),
+        "done-fingerprints": set(),
+        "run": manifest.new_run_id(),
+        "job": config["job"],
+    }
+    if config["manifest"]:
+        done_envs = manifest.Manifest(config["manifest"])
+        shared["done-fingerprints"] = {fp for fp in done_envs.records if done_envs.is_done(fp)}
+        print("manifest", config["manifest"], "lists", len(shared["done-fingerprints"]), "envs as done")
+
+    credit_gate = flow_control.create_gate(context, config)
+
+    cached_results = None
+    if config["result-cache"]:
+        cached_results = result_cache.ResultCache(config["result-cache"], config["monica-version"])
+        result_socket = context.socket(zmq.PUSH)
+        result_socket.connect("tcp://" + config["server"] + ":" + str(config["result-server-port"]))
+
     sent_env_count = 0
+    sent_env_ids = []
+    skipped_env_count = 0
     start_time = time.perf_counter()
 
-    # loop over all the experiments
-    for e_id, e in experiments.items():
-        for t_id, t in e["treatments"].items():
-            for p_id, p in t["plots"].items():
-
-                start_setup_time = time.perf_counter()
-
-                env_template["params"]["siteParameters"]["SoilProfileParameters"] = list(map(lambda k_v: k_v[1], p["soil"]["layers"].items()))
-                env_template["params"]["siteParameters"]["Latitude"] = float(t["field"]["FL_LAT"])
-                env_template["params"]["userEnvironmentParameters"]["Albedo"] = float(p["soil"]["SALB"])
-
-                env_template["climateData"] = {
-                    "startDate": t["weather_data"]["start_date"],
-                    "endDate": t["weather_data"]["end_date"],
-                    "data": t["weather_data"]["data"],
-                    "tamp": t["weather_station"]["TAMP"],
-                    "tav": t["weather_station"]["TAV"],
-                }
-
-                for st_model, model_code in [
-                    ("internal", "iMO"),
-                    ("Monica_SoilTemp", "MO"),
-                    ("DSSAT_ST_standalone", "DS"),
-                    ("DSSAT_EPICST_standalone", "DE"),
-                    ("Simplace_Soil_Temperature", "SA"),
-                    ("Stics_soil_temperature", "ST"),
-                    ("SQ_Soil_Temperature", "SQ"),
-                    ("BiomaSurfacePartonSoilSWATC", "PS"),
-                    ("BiomaSurfaceSWATSoilSWATC", "SW"),
-                    ("ApsimCampbell", "AP"),
-                ]:
-                    env_template["params"]["simulationParameters"]["SoilTempModel"] = st_model
-
-                    env_template["customId"] = {
-                        "env_id": sent_env_count + 1,
-                        "st_model": st_model,
-                        "model_code": model_code,
-                        "year": t["weather_data"]["start_date"][:4],
-                        "wst_dataset": t["WST_DATASET"],
-                        "soil_profile_id": p["SOIL_ID"],
-                    }
-
-                    socket.send_json(env_template)
-                    sent_env_count += 1
-
-                    stop_setup_time = time.perf_counter()
-                    print("Setup ", sent_env_count, " envs took ", (stop_setup_time - start_setup_time), " seconds")
+    last_task = []
+
+    def remember_last(tasks):
+        for task in tasks:
+            last_task[:] = [task]
+            yield task
+
+    for climate, envs, skipped_count, setup_s in parallel.imap_ordered(
+            create_plot_envs, remember_last(tasks), workers=int(config["workers"]), initializer=init_env_builder,
+            initargs=(shared,)):
+        skipped_env_count += skipped_count
+        if climate:
+            climate_publisher.publish_encoded(*climate)
+        for custom_id, frames in envs:
+            credit_gate.acquire(custom_id["env_id"])
+            result_bytes = cached_results.get(custom_id["fingerprint"]) if cached_results else None
+            if result_bytes is not None:
+                result_socket.send(result_cache.cached_result_msg(result_bytes, custom_id))
+            else:
+                socket.send_multipart(frames)
+            sent_env_count += 1
+            sent_env_ids.append(custom_id["env_id"])
+        if envs:
+            print("Setup of", len(envs), "envs of the plot took", setup_s, "seconds,", sent_env_count, "envs sent")
+
+    if int(config["workers"]) > 1 and last_task:
+        # the workers filled in copies of the env template, build the last plot again here, so the
+        # no_of_sent_envs message is the same complete env as with a single process
+        init_env_builder(shared)
+        create_plot_envs(last_task[0])
 
     env_template["customId"] = {
         "no_of_sent_envs": sent_env_count,
+        "run": shared["run"],
+        "sent_env_ids": resubmit.to_ranges(sent_env_ids),
     }
-    socket.send_json(env_template)
+    if config["job"]:
+        env_template["customId"]["job"] = config["job"]
+    if config["shard"]:
+        env_template["customId"]["shard"] = config["shard"]
+    codec.send(socket, env_template, wire_codec)
+    credit_gate.close()
 
     stop_time = time.perf_counter()
 
     # write summary of used json files
     try:
-        print("sending ", (sent_env_count - 1), " envs took ", (stop_time - start_time), " seconds")
+        print("sending ", sent_env_count, " envs took ", (stop_time - start_time), " seconds")
+        if skipped_env_count:
+            print("skipped ", skipped_env_count, " envs already done according to the manifest")
+        if cached_results:
+            print(cached_results.summary())
         print("exiting run_producer()")
     except Exception:
         raise
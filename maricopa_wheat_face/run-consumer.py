@@ -15,64 +15,155 @@
 # Landscape Systems Analysis at the ZALF.
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
 from io import StringIO
-import json
-import os
+from itertools import repeat
+import numpy as np
+from pathlib import Path
 import sys
 
-import zmq
 from zalfmas_common import common
 
-def run_consumer(server=None, port=None):
-    config = {
-        "mode": "remoteConsumer-remoteMonica",
-        "port": port if port else "7777",
-        "server": server if server else "localhost",  # "login01.cluster.zalf.de",
-        "writer_sr": None,
-        "path_to_out": "out",
-        "timeout": 600000  # 10min
-    }
+# make the shared amei_exercises package importable when started from within the exercise folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from amei_exercises import consumer
 
-    common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
+NA = None  # a column of "na"
+
+# growth stage (Zadoks) of the MONICA wheat stages 1 to 6, "na" for stage 3 and unknown stages
+STAGE_TO_ZADOKS = np.array(["na", "0", "9", "na", "51", "65", "89", "na"])
+
+# the columns of the daily file after FRAMEWORK_ID, MODEL_ID and TREAT_ID: (code, result key, NA or
+# function of the daily results returning the column's strings)
+DAILY_COLUMNS = [
+    ("DATE", "Date"),
+    ("LNUM", NA),
+    ("GSTZD", lambda results: STAGE_TO_ZADOKS[np.clip(
+        np.fromiter((vals["Stage"] for vals in results), dtype=np.int64, count=len(results)),
+        0, len(STAGE_TO_ZADOKS) - 1)].tolist()),
+    ("LAID", "LAID"),
+    ("LIPCD", NA),
+    ("CWAD", "CWAD"),
+    ("GWAD", "GWAD"),
+    ("GWGD", NA),
+    ("CNAD", "CNAD"),
+    ("GNAD", "GNAD"),
+    ("GNGD", NA),
+    ("RDPD", "RDPD"),
+    ("SWWPD", "SWWPD"),
+    ("DRND", "DRND"),
+    ("ROFD", "ROFD"),
+    ("NIAD", NA),
+    ("NLCD", "NLCD"),
+    ("NMND", "NMND"),
+    ("N2OED", "N2OED"),
+    ("NIMD", NA),
+    ("NDND", "NDND"),
+    ("GHFD", NA),
+    ("LHFD", NA),
+    ("HHFD", NA),
+    ("RND", NA),
+    ("TSSAV", "TSSAV"),
+    ("TSSMX", NA),
+    ("TSSMN", NA),
+    ("TGAV", NA),
+    ("TGMX", NA),
+    ("TGMN", NA),
+    ("EOAD", "EOAD"),
+    ("ETAD", "ETAD"),
+    ("EPSAD", NA),
+    ("ESAD", "ESAD"),
+    ("EPPAD", NA),
+    ("EPAD", "EPAD"),
+]
+
+
+class _FormattedValues(dict):
+    """str of the result values, MONICA rounds its outputs, so the same values come up again and again"""
+
+    def __missing__(self, value):
+        formatted = str(value)
+        # equal ints, bools and integral floats (also 0.0 and -0.0) would share an entry
+        if type(value) is float and not value.is_integer():
+            if len(self) > 200000:
+                self.clear()
+            self[value] = formatted
+        return formatted
+
+
+_formatted = _FormattedValues()
+
+
+def format_lines(results, columns, prefix):
+    """the tab separated lines of the daily results, the constant prefix columns followed by the columns"""
+    n = len(results)
+    cols = [repeat(value, n) for value in prefix]
+    for _, source in columns:
+        if source is NA:
+            cols.append(repeat("na", n))
+        elif callable(source):
+            cols.append(source(results))
+        else:
+            cols.append(map(_formatted.__getitem__, [vals[source] for vals in results]))
+    return ["\t".join(row) + "\n" for row in zip(*cols)]
+
+
+@lru_cache(maxsize=None)
+def _layer_depths(layers):
+    """the SLLT and SLLB columns of a day"""
+    depths = np.arange(layers + 1) * 5
+    return depths[:-1].astype(str).tolist(), depths[1:].astype(str).tolist()
+
+
+def layer_lines(results, model_code, t_id):
+    """the tab separated lines of the layered daily results, one per day and layer"""
+    if not results:
+        return []
+    layers = len(results[0]["TSAV"])
+    sllt, sllb = _layer_depths(layers)
+    days = np.array([f"MO\t{model_code}\t{t_id}\t{vals['Date']}" for vals in results])
+    cols = [
+        np.repeat(days, layers).tolist(),  # FRAMEWORK_ID, MODEL_ID, TREAT_ID, DATE
+        sllt * len(results),
+        sllb * len(results),
+        map(_formatted.__getitem__, [v for vals in results for v in vals["TSAV"]]),
+        repeat("na\tna", len(results) * layers),  # TSMX, TSMN
+        map(_formatted.__getitem__, [v for vals in results for v in vals["SWLD"]]),
+        map(_formatted.__getitem__, [v for vals in results for v in vals["SNLD"]]),
+    ]
+    return ["\t".join(row) + "\n" for row in zip(*cols)]
+
+
+# layered results kept in the layer store
+LAYER_VARIABLES = ["TSAV", "SWLD", "SNLD"]
 
-    path_to_out = config["path_to_out"]
-    if not os.path.exists(path_to_out):
-        try:
-            os.makedirs(path_to_out)
-        except OSError:
-            print("run-consumer.py: Couldn't create dir:", path_to_out, "!")
-
-    context = zmq.Context()
-    socket = context.socket(zmq.PULL)
-
-    socket.connect("tcp://" + config["server"] + ":" + config["port"])
-    socket.RCVTIMEO = config["timeout"]
-
-    envs_received = 0
-    no_of_envs_expected = None
-    leave = False
-    while not leave:
-        try:
-            msg: dict = socket.recv_json()  # encoding="latin-1"
-
-            custom_id = msg["customId"]
-            if "no_of_sent_envs" in custom_id:
-                no_of_envs_expected = custom_id["no_of_sent_envs"]
-            else:
-                envs_received += 1
-                print("received result customId:", custom_id)
-
-                #st_model = custom_id["st_model"]
-                model_code = custom_id["model_code"]
-                year_str = custom_id["year"]
-                t_id = custom_id["treatment_id"]
-                #wst_dataset = custom_id["wst_dataset"]
-                #soil_profile_id = custom_id["soil_profile_id"]
-
-                with open(f"{path_to_out}/{model_code}MOLayersMaricopa{t_id}.txt", "wt") as _:
-                    _.write(f"""\
+EXERCISE = "maricopa_wheat_face"
+
+
+def store_keys(custom_id):
+    """model_code and treatment of a result in the result store"""
+    return custom_id["model_code"], custom_id["treatment_id"]
+
+
+def layer_results(msg):
+    """the daily results kept in the layer store"""
+    if msg.get("data"):
+        yield msg["data"][0].get("results", [])
+
+
+def write_results(msg, path_to_out):
+    """write the output files of a result message and return their paths"""
+    custom_id = msg["customId"]
+    #st_model = custom_id["st_model"]
+    model_code = custom_id["model_code"]
+    year_str = custom_id["year"]
+    t_id = custom_id["treatment_id"]
+    #wst_dataset = custom_id["wst_dataset"]
+    #soil_profile_id = custom_id["soil_profile_id"]
+
+    with open(f"{path_to_out}/{model_code}MOLayersMaricopa{t_id}.txt", "wt") as _:
+        _.write(f"""\
 Maricopa Wheat FACE										
 Model: MONICA version 3.6.38 - {datetime.now().isoformat()}
 Modeler_name: Michael Berg-Mohnicke
@@ -81,26 +172,10 @@ framework_ID	model_ID	treatment_ID	date	soil_layer_top_depth	soil_layer_base_dep
 text	text	text	(YYYY-MM-DD)	cm	cm  °C	°C	°C	cm3/cm3	kg[N]/ha
 FRAMEWORK_ID	MODEL_ID	TREAT_ID	DATE	SLLT	SLLB	TSAV	TSMX	TSMN	SWLD	SNLD
 """)
-                    results = msg["data"][0].get("results", [])
-                    for vals in results:
-                        for layer_index in range(42):
-                            out = StringIO()
-                            out.write(f"MO\t")
-                            out.write(f"{model_code}\t")
-                            out.write(f"{t_id}\t")
-                            out.write(f"{vals['Date']}\t")
-                            out.write(f"{layer_index * 5}\t") #SLLT
-                            out.write(f"{(layer_index + 1) * 5}\t") #SLLB
-                            out.write(f"{vals['TSAV'][layer_index]}\t")
-                            out.write("na\t") #TSMX
-                            out.write("na\t") #TSMN
-                            out.write(f"{vals['SWLD'][layer_index]}\t")
-                            out.write(f"{vals['SNLD'][layer_index]}")
-                            out.write("\n")
-                            _.write(out.getvalue())
-
-                with open(f"{path_to_out}/{model_code}MODailyMaricopa{t_id}.txt", "wt") as _:
-                    _.write(f"""\
+        _.writelines(layer_lines(msg["data"][0].get("results", []), model_code, t_id))
+
+    with open(f"{path_to_out}/{model_code}MODailyMaricopa{t_id}.txt", "wt") as _:
+        _.write(f"""\
 Maricopa Wheat FACE																																							
 Model: MONICA version 3.6.38 - {datetime.now().isoformat()}
 Modeler_name: Michael Berg-Mohnicke
@@ -109,55 +184,10 @@ framework_ID	model_ID	treatment_ID	date	leaf_number_as_haun_stg	growth_stage_Zad
 text	text	text	(YYYY-MM-DD)	leaf\mainstem	number	m2/m2	%	kg[DM]/ha	kg[DM]/ha	mg[DM]/grain	kg[N]/ha	kg[N]/ha	mg[N]/grain	m	cm3/cm3	mm/d	mm/d	kg[N]/ha/d	kg[N]/ha/d	kg[N]/ha/d	kg[N]/ha/d	kg[N]/ha/d	kg[N]/ha/d	w/m2	w/m2	w/m2	w/m2	°C	°C	°C	°C	°C	°C	mm/d	mm/d	mm/d	mm/d	mm/d	mm/d
 FRAMEWORK_ID	MODEL_ID	TREAT_ID	DATE	LNUM	GSTZD	LAID	LIPCD	CWAD	GWAD	GWGD	CNAD	GNAD	GNGD	RDPD	SWWPD	DRND	ROFD	NIAD	NLCD	NMND	N2OED	NIMD	NDND	GHFD	LHFD	HHFD	RND	TSSAV	TSSMX	TSSMN	TGAV	TGMX	TGMN	EOAD	ETAD	EPSAD	ESAD	EPPAD	EPAD
 """)
-                    results = msg["data"][0].get("results", [])
-                    for vals in results:
-                        out = StringIO()
-                        out.write("MO\t")
-                        out.write(f"{model_code}\t")
-                        out.write(f"{t_id}\t")
-                        out.write("na\t") # LNUM = "na"
-                        if vals["Stage"] == 1: out.write("0\t") #GSTZD
-                        elif vals["Stage"] == 2: out.write("9\t") #GSTZD
-                        elif vals["Stage"] == 3: out.write("na\t") #GSTZD
-                        elif vals["Stage"] == 4: out.write("51\t") #GSTZD
-                        elif vals["Stage"] == 5: out.write("65\t") #GSTZD
-                        elif vals["Stage"] == 6: out.write("89\t") #GSTZD
-                        out.write("na\t") #LIPCD
-                        out.write("na\t") #GWGD
-                        out.write(f'{vals["CNAD"]}\t')
-                        out.write(f'{vals["GNAD"]}\t')
-                        out.write("na\t") #GNGD
-                        out.write(f'{vals["RDPD"]}\t')
-                        out.write(f'{vals["SWWPD"]}\t')
-                        out.write(f'{vals["DRND"]}\t')
-                        out.write(f'{vals["ROFD"]}\t')
-                        out.write("na\t") #NIAD
-                        out.write(f'{vals["NLCD"]}\t')
-                        out.write(f'{vals["NMND"]}\t')
-                        out.write(f'{vals["N2OED"]}\t')
-                        out.write("na\t") #NIMD
-                        out.write(f'{vals["NDND"]}\t')
-                        out.write("na\t") #GHFD
-                        out.write("na\t") #LHFD
-                        out.write("na\t") #HHFD
-                        out.write(f'na\t')#{vals["RND"]}\t')
-                        out.write(f'{vals["TSSAV"]}\t')
-                        out.write("na\t") #TSSMX
-                        out.write("na\t") #TSSMN
-                        out.write("na\t") #TGAV
-                        out.write("na\t") #TGMX
-                        out.write("na\t") #TGMN
-                        out.write(f'{vals["EOAD"]}\t')
-                        out.write(f'{vals["ETAD"]}\t')
-                        out.write("na\t") #EPSAD
-                        out.write(f'{vals["ESAD"]}\t')
-                        out.write("na\t") #EPPAD
-                        out.write(f'{vals["EPAD"]}\t')
-                        out.write("\n")
-                        _.write(out.getvalue())
-
-                with open(f"{path_to_out}/{model_code}MOSummaryMaricopa{t_id}.txt", "w") as _:
-                    _.write(f"""\
+        _.writelines(format_lines(msg["data"][0].get("results", []), DAILY_COLUMNS, ("MO", model_code, t_id)))
+
+    with open(f"{path_to_out}/{model_code}MOSummaryMaricopa{t_id}.txt", "w") as _:
+        _.write(f"""\
 Maricopa Wheat FACE																																		
 Model: MONICA version 3.6.38 - {datetime.now().isoformat()}
 Modeler_name: Michael Berg-Mohnicke
@@ -166,67 +196,67 @@ framework_ID	model_ID	treatment_ID	planting_date	emergence_date	anthesis_date	ph
 text	text	text	date	date	date	date	leaf\mainstem	m2/m2	%	kg[DM]/ha	kg[DM]/ha	kg[DM]/ha	number/m2	mg[DM]/grain	kg[N]/ha	kg[N]/ha	kg[N]/ha	mg[N]/grain	m	mm	mm	mm	kg[N]/ha	kg[N]/ha	kg[N]/ha	kg[N]/ha	kg[N]/ha	kg[N]/ha	mm	mm	mm	mm	mm	mm
 FRAMEWORK_ID	MODEL_ID	TREAT_ID	PDATE	PLDAE	ADAT	MDAT	LnoSM	LAIX	LIPCCM	CWAA	CWAM	GWAM	HnoAM	GWGM	CNAA	CNAM	GNAM	GNGM	RDPM	WAVSSM	DRCM	ROCM	NIAVSSM	NLCM	NMNCM	N2OECM	NIMCM	NDNCM	EOCM	ETCM	EPSCM	ESCM	EPPCM	EPCM
 """)
-                    results_summary: dict = msg["data"][1].get("results", [])
-                    results_sowing = msg["data"][2].get("results", [])
-                    results_emergence = msg["data"][3].get("results", [])
-                    results_anthesis = msg["data"][4].get("results", [])
-                    results_maturity = msg["data"][5].get("results", [])
-                    for i, vals in enumerate(results_summary):
-                        vals_s = results_sowing[i]
-                        vals_e = results_emergence[i]
-                        vals_a = results_anthesis[i]
-                        vals_m = results_maturity[i]
-
-                        out = StringIO()
-                        out.write(f"MO\t")
-                        out.write(f"{model_code}\t")
-                        out.write(f"{t_id}\t")
-                        out.write(f"{vals_s['PDATE']}\t")
-                        out.write(f"{vals_e['PLDAE']}\t")
-                        out.write(f"{vals_a['ADAT']}\t")
-                        out.write(f"{vals_m['MDAT']}\t")
-                        out.write(f"na\t") #LnoSM
-                        out.write(f"{vals['LAIX']}\t")
-                        out.write(f"na\t") #LIPCCM
-                        out.write(f"{vals_a['CWAA']}\t")
-                        out.write(f"{vals_m['CWAM']}\t")
-                        out.write(f"{vals_m['GWAM']}\t")
-                        out.write(f"{vals_m['HnoAM']}\t")
-                        out.write(f"na\t") #GWGM
-                        out.write(f"{vals_a['CNAA']}\t")
-                        out.write(f"{vals_m['CNAM']}\t")
-                        out.write(f"{vals_m['GNAM']}\t")
-                        out.write(f"na\t") #GNGM
-                        out.write(f"{vals['RDPM']}\t")
-                        out.write(f"{vals['WAVSSM']}\t")
-                        out.write(f"{vals['DRCM']}\t")
-                        out.write(f"{vals['ROCM']}\t")
-                        out.write(f"na\t") #NIAVSSM
-                        out.write(f"{vals['NLCM']}\t")
-                        out.write(f"{vals['NMNCM']}\t")
-                        out.write(f"{vals['N2OECM']}\t")
-                        out.write(f"na\t") #NIMCM
-                        out.write(f"{vals['NDNCM']}\t")
-                        out.write(f"{vals['EOCM']}\t")
-                        out.write(f"{vals['ETCM']}\t")
-                        out.write(f"na\t") #EPSCM
-                        out.write(f"{vals['ESCM']}\t")
-                        out.write(f"na\t") #EPPCM
-                        out.write(f"{vals['EPCM']}")
-                        out.write("\n")
-                        _.write(out.getvalue())
-
-            if no_of_envs_expected == envs_received:
-                print("last expected env received")
-                leave = True
-
-        except zmq.error.Again as _e:
-            print('no response from the server (with "timeout"=%d ms) ' % socket.RCVTIMEO)
-            continue
-        except Exception as e:
-            print("Exception:", e)
-            break
+        results_summary: dict = msg["data"][1].get("results", [])
+        results_sowing = msg["data"][2].get("results", [])
+        results_emergence = msg["data"][3].get("results", [])
+        results_anthesis = msg["data"][4].get("results", [])
+        results_maturity = msg["data"][5].get("results", [])
+        for i, vals in enumerate(results_summary):
+            vals_s = results_sowing[i]
+            vals_e = results_emergence[i]
+            vals_a = results_anthesis[i]
+            vals_m = results_maturity[i]
+
+            out = StringIO()
+            out.write(f"MO\t")
+            out.write(f"{model_code}\t")
+            out.write(f"{t_id}\t")
+            out.write(f"{vals_s['PDATE']}\t")
+            out.write(f"{vals_e['PLDAE']}\t")
+            out.write(f"{vals_a['ADAT']}\t")
+            out.write(f"{vals_m['MDAT']}\t")
+            out.write(f"na\t") #LnoSM
+            out.write(f"{vals['LAIX']}\t")
+            out.write(f"na\t") #LIPCCM
+            out.write(f"{vals_a['CWAA']}\t")
+            out.write(f"{vals_m['CWAM']}\t")
+            out.write(f"{vals_m['GWAM']}\t")
+            out.write(f"{vals_m['HnoAM']}\t")
+            out.write(f"na\t") #GWGM
+            out.write(f"{vals_a['CNAA']}\t")
+            out.write(f"{vals_m['CNAM']}\t")
+            out.write(f"{vals_m['GNAM']}\t")
+            out.write(f"na\t") #GNGM
+            out.write(f"{vals['RDPM']}\t")
+            out.write(f"{vals['WAVSSM']}\t")
+            out.write(f"{vals['DRCM']}\t")
+            out.write(f"{vals['ROCM']}\t")
+            out.write(f"na\t") #NIAVSSM
+            out.write(f"{vals['NLCM']}\t")
+            out.write(f"{vals['NMNCM']}\t")
+            out.write(f"{vals['N2OECM']}\t")
+            out.write(f"na\t") #NIMCM
+            out.write(f"{vals['NDNCM']}\t")
+            out.write(f"{vals['EOCM']}\t")
+            out.write(f"{vals['ETCM']}\t")
+            out.write(f"na\t") #EPSCM
+            out.write(f"{vals['ESCM']}\t")
+            out.write(f"na\t") #EPPCM
+            out.write(f"{vals['EPCM']}")
+            out.write("\n")
+            _.write(out.getvalue())
+
+    return [f"{path_to_out}/{model_code}MO{kind}Maricopa{t_id}.txt" for kind in ["Layers", "Daily", "Summary"]]
+
+
+def run_consumer(server=None, port=None):
+    config = consumer.default_config(server, port)
+    config["layer-store"] = ""  # e.g. out/layers -> also store the layered results in one memory mappable file
+
+    common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
 
+    consumer.run(config, EXERCISE, write_results, store_keys, layer_results=layer_results,
+                 layer_variables=LAYER_VARIABLES)
     print("exiting run_consumer()")
 
 
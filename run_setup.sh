@@ -23,16 +23,20 @@ do
 done
 echo "monica_pids -> ${monica_pids[*]}"
 
+# the consumers below share the load and count the received results of this job together
+SHARED_COUNTER=out/consumers.count
+JOB=$(date +%Y%m%dT%H%M%S)
+
 echo "run producer"
-#$PATH_TO_PYTHON run-producer.py &
-poetry run python run-producer.py &
+#$PATH_TO_PYTHON run-producer.py job="$JOB" &
+poetry run python run-producer.py job="$JOB" &
 echo "run consumer"
-#$PATH_TO_PYTHON run-consumer.py
-poetry run python run-consumer.py &
-poetry run python run-consumer.py &
-poetry run python run-consumer.py &
-poetry run python run-consumer.py &
-poetry run python run-consumer.py
+#$PATH_TO_PYTHON run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB"
+poetry run python run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB" &
+poetry run python run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB" &
+poetry run python run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB" &
+poetry run python run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB" &
+poetry run python run-consumer.py shared-counter="$SHARED_COUNTER" job="$JOB"
 echo "consumer finished -> kill all servers and proxies"
 
 SLEEP 120
@@ -15,228 +15,224 @@
 # Landscape Systems Analysis at the ZALF.
 # Copyright (C: Leibniz Centre for Agricultural Landscape Research (ZALF)
 
-from collections import defaultdict
 from datetime import datetime
-import json
-import os
+from functools import lru_cache
+import numpy as np
+from pathlib import Path
 import sys
-import zmq
 from zalfmas_common import common
 
+# make the shared amei_exercises package importable when started from within the exercise folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from amei_exercises import consumer, sensitivity
+
+# result keys of the soil temperatures of the models summarized for the sensitivity indices
+MODEL_VARIABLES = {
+    "MOO": {"SurfTemp": "SurfTemp", "SoilTemp": "SoilTemp"},
+    "MOC": {"SurfTemp": "AMEI_Monica_SurfTemp", "SoilTemp": "AMEI_Monica_SoilTemp"},
+    "DSC": {"SurfTemp": "AMEI_DSSAT_ST_standalone_SurfTemp", "SoilTemp": "AMEI_DSSAT_ST_standalone_SoilTemp"},
+    "DEC": {"SurfTemp": "AMEI_DSSAT_EPICST_standalone_SurfTemp",
+            "SoilTemp": "AMEI_DSSAT_EPICST_standalone_SoilTemp"},
+    "SAC": {"SurfTemp": "AMEI_Simplace_Soil_Temperature_SurfTemp",
+            "SoilTemp": "AMEI_Simplace_Soil_Temperature_SoilTemp"},
+    "SQC": {"SoilTemp_min": "AMEI_SQ_Soil_Temperature_SoilTemp_min",
+            "SoilTemp_max": "AMEI_SQ_Soil_Temperature_SoilTemp_max",
+            "SoilTemp_deep": "AMEI_SQ_Soil_Temperature_SoilTemp_deep"},
+    "PSC": {"SurfTemp": "AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp",
+            "SoilTemp": "AMEI_BiomaSurfacePartonSoilSWATC_SoilTemp"},
+    "SWC": {"SurfTemp": "AMEI_BiomaSurfaceSWATSoilSWATC_SurfTemp",
+            "SoilTemp": "AMEI_BiomaSurfaceSWATSoilSWATC_SoilTemp"},
+    "STC": {"SurfTemp": "AMEI_Stics_soil_temperature_SurfTemp", "SoilTemp": "AMEI_Stics_soil_temperature_SoilTemp"},
+    "APC": {"SurfTemp": "AMEI_ApsimCampbell_SurfTemp", "SoilTemp": "AMEI_ApsimCampbell_SoilTemp"},
+}
+
+
+@lru_cache(maxsize=None)
+def layer_blocks(n_layers, lt_cm, plts_cm):
+    """(first layer, number of layers, upper cm, lower cm) of the blocks of the n_layers equally thick (lt_cm)
+    layers averaged to the layers of the soil profile (plts_cm), the profile layers are filled one after
+    the other and the last one is repeated below the profile, a remaining incomplete block is dropped"""
+    blocks = []
+    first = 0
+    sum_lt_cm = 0
+    i_plt = 0
+    for i in range(n_layers):
+        sum_lt_cm += lt_cm
+        if sum_lt_cm >= plts_cm[i_plt]:
+            lower = (i + 1) * lt_cm
+            blocks.append((first, i + 1 - first, lower - sum_lt_cm, lower))
+            if i_plt < len(plts_cm) - 1:
+                i_plt += 1
+            first = i + 1
+            sum_lt_cm = 0
+    return tuple(blocks)
+
+
+def aggregate_layers(results, key, lt_cm, plts_cm):
+    """the blocks (see layer_blocks) and for each day the block averages of the soil temperatures under key"""
+    if not results:
+        return (), []
+    blocks = layer_blocks(len(results[0][key]), lt_cm, tuple(plts_cm))
+    if not blocks:
+        return blocks, [[] for _ in results]
+    end = blocks[-1][0] + blocks[-1][1]
+    s_temps = np.array([vals[key][:end] for vals in results], dtype=np.float64)
+    sums = np.add.reduceat(s_temps, [first for first, _, _, _ in blocks], axis=1)
+    return blocks, (sums / np.array([n for _, n, _, _ in blocks], dtype=np.float64)).tolist()
+
+
+def _aggregated_lines(date, surf_temp, avg_s_temps, blocks):
+    """lines of the soil temperatures averaged over the layers of the soil profile"""
+    lines = [f"{date}, 0, 0, {surf_temp}, na, na\n"]
+    for (_, _, upper, lower), avg_s_temp in zip(blocks, avg_s_temps):
+        lines.append(f"{date}, {upper}, {lower}, {round(avg_s_temp, 6)}, na, na\n")
+    return lines
+
+
+def _profile_lines(date, surf_temp, soil_temps, plts_cm, surf_max="na", surf_min="na", soil_max=None, soil_min=None):
+    """lines of the soil temperatures of the layers of the soil profile"""
+    lines = [f"{date}, 0, 0, {surf_temp}, {surf_max}, {surf_min}\n"]
+    upper_cm = 0
+    for i, s_temp in enumerate(soil_temps):
+        lower_cm = upper_cm + plts_cm[i]
+        lines.append(f"{date}, {upper_cm}, {lower_cm}, {s_temp}, {soil_max[i] if soil_max else 'na'}, "
+                     f"{soil_min[i] if soil_min else 'na'}\n")
+        upper_cm = lower_cm
+    return lines
+
+
+def _sqc_lines(date, vals):
+    st_min = vals["AMEI_SQ_Soil_Temperature_SoilTemp_min"]
+    st_max = vals["AMEI_SQ_Soil_Temperature_SoilTemp_max"]
+    st_deep = vals["AMEI_SQ_Soil_Temperature_SoilTemp_deep"]
+    lines = [f"{date}, 0, 0, na, na, na\n",
+             f"{date}, 0, 5, {round((st_min + st_max)/2.0, 6)}, {st_max}, {st_min}\n"]
+    for upper_cm, lower_cm in SQC_LAYER_DEPTHS:
+        lines.append(f"{date}, {upper_cm}, {lower_cm}, {st_deep}, na, na\n")
+    return lines
+
+
+SQC_LAYER_DEPTHS = [(5, 15), (15, 30), (30, 45), (45, 60), (60, 90), (90, 120), (120, 150), (150, 180), (180, 210)]
+
+# the lines of the i-th day (vals) in the output file of each model, profile holds the profile layer
+# thicknesses (plts_cm) and the blocks and averages of the aggregated MONICA soil temperatures
+MODEL_LINES = {
+    "MOO": lambda d, i, vals, profile: _aggregated_lines(
+        d, vals["SurfTemp"], profile["SoilTemp"][i], profile["SoilTemp_blocks"]),
+    "MOC": lambda d, i, vals, profile: _aggregated_lines(
+        d, vals["AMEI_Monica_SurfTemp"], profile["AMEI_Monica_SoilTemp"][i],
+        profile["AMEI_Monica_SoilTemp_blocks"]),
+    "DSC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_DSSAT_ST_standalone_SurfTemp"], vals["AMEI_DSSAT_ST_standalone_SoilTemp"], profile["plts_cm"]),
+    "DEC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_DSSAT_EPICST_standalone_SurfTemp"], vals["AMEI_DSSAT_EPICST_standalone_SoilTemp"],
+        profile["plts_cm"]),
+    "SAC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_Simplace_Soil_Temperature_SurfTemp"], vals["AMEI_Simplace_Soil_Temperature_SoilTemp"],
+        profile["plts_cm"]),
+    "SQC": lambda d, i, vals, profile: _sqc_lines(d, vals),
+    "PSC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp"], vals["AMEI_BiomaSurfacePartonSoilSWATC_SoilTemp"],
+        profile["plts_cm"], surf_max=vals["AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp_max"],
+        surf_min=vals["AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp_min"]),
+    "SWC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_BiomaSurfaceSWATSoilSWATC_SurfTemp"], vals["AMEI_BiomaSurfaceSWATSoilSWATC_SoilTemp"],
+        profile["plts_cm"]),
+    "STC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_Stics_soil_temperature_SurfTemp"], vals["AMEI_Stics_soil_temperature_SoilTemp"], profile["plts_cm"]),
+    "APC": lambda d, i, vals, profile: _profile_lines(
+        d, vals["AMEI_ApsimCampbell_SurfTemp"], vals["AMEI_ApsimCampbell_SoilTemp"], profile["plts_cm"],
+        surf_max=vals["AMEI_ApsimCampbell_SurfTemp_max"], surf_min=vals["AMEI_ApsimCampbell_SurfTemp_min"],
+        soil_max=vals["AMEI_ApsimCampbell_SoilTemp_max"], soil_min=vals["AMEI_ApsimCampbell_SoilTemp_min"]),
+}
+
+
+def write_model_files(results, lt_cm, plts_cm, path_of, flush_every_days=365):
+    """write the output files of all models (path_of(model_code)) in a single pass over the daily results"""
+    profile = {"plts_cm": plts_cm}
+    for key in ("SoilTemp", "AMEI_Monica_SoilTemp"):
+        profile[f"{key}_blocks"], profile[key] = aggregate_layers(results, key, lt_cm, plts_cm)
+
+    files = {mc: open(path_of(mc), "w", buffering=1 << 20) for mc in MODEL_LINES}
+    try:
+        lines = {mc: ["DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n"] for mc in MODEL_LINES}
+        for i, vals in enumerate(results):
+            date = vals["Date"]
+            for mc, day_lines in MODEL_LINES.items():
+                lines[mc].extend(day_lines(date, i, vals, profile))
+            if (i + 1) % flush_every_days == 0:
+                for mc, _ in files.items():
+                    _.writelines(lines[mc])
+                    lines[mc].clear()
+        for mc, _ in files.items():
+            _.writelines(lines[mc])
+    finally:
+        for _ in files.values():
+            _.close()
+
+
+EXERCISE = "soil_temperature_sensitivity_analysis"
+
+
+def store_keys(custom_id):
+    """model_code and treatment of a result in the result store"""
+    # all models are part of every result
+    sample = f"_{custom_id['sample']['id']}" if "sample" in custom_id else ""
+    return "MO", f"{custom_id['location']}_{custom_id['soil']}_{custom_id['lai']}_{custom_id['aw']}{sample}"
+
+
+def write_results(msg, path_to_out):
+    """write the output files of a result message and return their paths"""
+    custom_id = msg["customId"]
+    loc = custom_id["location"]
+    soil = custom_id["soil"]
+    lai = custom_id["lai"]
+    aw = custom_id["aw"]
+    # sampled envs share the weather dataset, so they need their own files
+    sample = f"_{custom_id['sample']['id']}" if "sample" in custom_id else ""
+    lt = custom_id["layerThickness"]
+    lt_cm = int(lt * 100)
+    plts_cm = list(map(lambda lt_m: int(lt_m*100), custom_id["profileLTs"]))
+
+    for data in msg.get("data", []):
+        write_model_files(data.get("results", []), lt_cm, plts_cm,
+                          lambda mc: f"{path_to_out}/SoilTemperature_MO_{mc}_{loc}_{soil}_{lai}_{aw}{sample}.txt")
+
+    return [f"{path_to_out}/SoilTemperature_MO_{mc}_{loc}_{soil}_{lai}_{aw}{sample}.txt" for mc in MODEL_LINES]
+
+
 def run_consumer(server=None, port=None):
     """collect data from workers"""
 
-    config = {
-        "mode": "remoteConsumer-remoteMonica",
-        "port": port if port else "7777",
-        "server": server if server else "localhost",  # "login01.cluster.zalf.de",
-        "writer_sr": None,
-        "path_to_out": "out",
-        "timeout": 600000  # 10min
-    }
+    config = consumer.default_config(server, port)
+    config["sensitivity-indices"] = ""  # e.g. out/sensitivity_indices.csv -> online Sobol/Morris indices of sampled envs
 
     common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
 
-    path_to_out = config["path_to_out"]
-    if not os.path.exists(path_to_out):
-        try:
-            os.makedirs(path_to_out)
-        except OSError:
-            print("run-consumer.py: Couldn't create dir:", path_to_out, "!")
-
-    context = zmq.Context()
-    socket = context.socket(zmq.PULL)
-
-    socket.connect("tcp://" + config["server"] + ":" + config["port"])
-    socket.RCVTIMEO = config["timeout"]
-
-    envs_received = 0
-    no_of_envs_expected = None
-    leave = False
-    while not leave:
-        try:
-            msg: dict = socket.recv_json()  # encoding="latin-1"
-
-            custom_id = msg["customId"]
-            if "no_of_sent_envs" in custom_id:
-                no_of_envs_expected = custom_id["no_of_sent_envs"]
-            else:
-                envs_received += 1
-                print("received result customId:", custom_id)
-
-                loc = custom_id["location"]
-                soil = custom_id["soil"]
-                lai = custom_id["lai"]
-                aw = custom_id["aw"]
-                lt = custom_id["layerThickness"]
-                lt_cm = int(lt * 100)
-                plts_cm = list(map(lambda lt_m: int(lt_m*100), custom_id["profileLTs"]))
+    indices = None
 
+    def received(msg):
+        nonlocal indices
+        custom_id = msg["customId"]
+        if config["sensitivity-indices"] and "sample" in custom_id:
+            if indices is None:
+                indices = sensitivity.create_indices(custom_id["sample"]["sampler"])
+            if indices:
+                outputs = {}
                 for data in msg.get("data", []):
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_MOO_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, {vals['SurfTemp']}, na, na\n")
-                            sum_lt_cm: int = 0
-                            sum_s_temp: float = 0
-
-                            plt_iter = iter(plts_cm)
-                            plt = next(plt_iter)
-                            i_plt = 1
-                            for i, s_temp in enumerate(vals["SoilTemp"]):
-                                sum_lt_cm += lt_cm
-                                sum_s_temp += s_temp
-                                if sum_lt_cm >= plt:
-                                    avg_s_temp = round(sum_s_temp / (sum_lt_cm / lt_cm), 6)
-                                    lower = (i + 1) * lt_cm
-                                    upper = lower - sum_lt_cm
-                                    _.write(f"{vals['Date']}, {upper}, {lower}, {avg_s_temp}, na, na\n")
-                                    if i_plt < len(plts_cm):
-                                        plt = next(plt_iter)
-                                        i_plt += 1
-                                    sum_lt_cm = 0
-                                    sum_s_temp = 0.0
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_MOC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, {vals['AMEI_Monica_SurfTemp']}, na, na\n")
-                            sum_lt_cm: int = 0
-                            sum_s_temp: float = 0
-
-                            plt_iter = iter(plts_cm)
-                            plt = next(plt_iter)
-                            i_plt = 1
-                            for i, s_temp in enumerate(vals["AMEI_Monica_SoilTemp"]):
-                                sum_lt_cm += lt_cm
-                                sum_s_temp += s_temp
-                                if sum_lt_cm >= plt:
-                                    avg_s_temp = round(sum_s_temp / (sum_lt_cm / lt_cm), 6)
-                                    lower = (i + 1) * lt_cm
-                                    upper = lower - sum_lt_cm
-                                    _.write(f"{vals['Date']}, {upper}, {lower}, {avg_s_temp}, na, na\n")
-                                    if i_plt < len(plts_cm):
-                                        plt = next(plt_iter)
-                                        i_plt += 1
-                                    sum_lt_cm = 0
-                                    sum_s_temp = 0.0
-                    #continue
-                    with open(f"{path_to_out}/SoilTemperature_MO_DSC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, {vals['AMEI_DSSAT_ST_standalone_SurfTemp']}, na, na\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_DSSAT_ST_standalone_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_DEC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, {vals['AMEI_DSSAT_EPICST_standalone_SurfTemp']}, na, na\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_DSSAT_EPICST_standalone_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_SAC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, {vals['AMEI_Simplace_Soil_Temperature_SurfTemp']}, na, na\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_Simplace_Soil_Temperature_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_SQC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(f"{vals['Date']}, 0, 0, na, na, na\n")
-                            st_min = vals["AMEI_SQ_Soil_Temperature_SoilTemp_min"]
-                            st_max = vals["AMEI_SQ_Soil_Temperature_SoilTemp_max"]
-                            _.write(f"{vals['Date']}, 0, 5, {round((st_min + st_max)/2.0, 6)}, {st_max}, {st_min}\n")
-                            layer_depths = [(5, 15), (15, 30), (30, 45), (45, 60),
-                                            (60, 90), (90, 120), (120, 150), (150, 180), (180, 210)]
-                            for upper_cm, lower_cm in layer_depths:
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {vals['AMEI_SQ_Soil_Temperature_SoilTemp_deep']}, na, na\n")
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_PSC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(
-                                f"{vals['Date']}, 0, 0, {vals['AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp']}, {vals['AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp_max']}, {vals['AMEI_BiomaSurfacePartonSoilSWATC_SurfTemp_min']}\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_BiomaSurfacePartonSoilSWATC_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_SWC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(
-                                f"{vals['Date']}, 0, 0, {vals['AMEI_BiomaSurfaceSWATSoilSWATC_SurfTemp']}, na, na\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_BiomaSurfaceSWATSoilSWATC_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_STC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(
-                                f"{vals['Date']}, 0, 0, {vals['AMEI_Stics_soil_temperature_SurfTemp']}, na, na\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_Stics_soil_temperature_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, na, na\n")
-                                upper_cm = lower_cm
-
-                    with open(f"{path_to_out}/SoilTemperature_MO_APC_{loc}_{soil}_{lai}_{aw}.txt", "w") as _:
-                        _.write(f"DATE, SLLT, SLLB, TSLD, TSLX, TSLN\n")
-                        results = data.get("results", [])
-                        for vals in results:
-                            _.write(
-                                f"{vals['Date']}, 0, 0, {vals['AMEI_ApsimCampbell_SurfTemp']}, {vals['AMEI_ApsimCampbell_SurfTemp_max']}, {vals['AMEI_ApsimCampbell_SurfTemp_min']}\n")
-                            upper_cm = 0
-                            for i, s_temp in enumerate(vals["AMEI_ApsimCampbell_SoilTemp"]):
-                                lt_cm = plts_cm[i]
-                                lower_cm = upper_cm + lt_cm
-                                _.write(f"{vals['Date']}, {upper_cm}, {lower_cm}, {s_temp}, {vals['AMEI_ApsimCampbell_SoilTemp_max'][i]}, {vals['AMEI_ApsimCampbell_SoilTemp_min'][i]}\n")
-                                upper_cm = lower_cm
-
-            if no_of_envs_expected == envs_received:
-                print("last expected env received")
-                leave = True
-
-        except zmq.error.Again as _e:
-            print('no response from the server (with "timeout"=%d ms) ' % socket.RCVTIMEO)
-            break
-        except Exception as e:
-            print("Exception:", e)
-            break
-
+                    for mc, variables in MODEL_VARIABLES.items():
+                        for key, value in sensitivity.summarize(data.get("results", []), variables).items():
+                            outputs[(mc, *key)] = value
+                indices.add((custom_id["location"], custom_id["soil"]), custom_id["sample"],
+                            list(custom_id["factors"]), outputs)
+
+    consumer.run(config, EXERCISE, write_results, store_keys, received=received, leave_on_timeout=True)
+
+    if indices:
+        sensitivity.write_csv(config["sensitivity-indices"], indices, ("location", "soil"),
+                              ("model", "variable", "layer", "statistic"))
+        print("wrote sensitivity indices to", config["sensitivity-indices"],
+              "incomplete samples:", indices.incomplete)
     print("exiting run_consumer()")
 
 
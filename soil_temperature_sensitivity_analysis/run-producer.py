@@ -26,6 +26,12 @@ import zmq
 from zalfmas_common import common, csv
 from zalfmas_common.model import monica_io
 
+# make the shared amei_exercises package importable when started from within the exercise folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from amei_exercises import (codec, fingerprint, flow_control, manifest, result_cache, resubmit, samplers, sharding,
+                            sweep)
+from amei_exercises.wth_store import WthStore, header_to_acd_indices
+
 PATHS = {
     # adjust the local path to your environment
     "mbm-local-local": {
@@ -54,6 +60,25 @@ PATHS = {
     },
 }
 
+# customData factors which have a column in Treatment.csv
+TREATMENT_COLUMNS = {"LAI": "LAID", "AWC": "AWC", "CWAD": "CWAD", "IRVAL": "IRVAL", "MLTHK": "MLTHK"}
+
+
+def nearest_treatment_id(treatment_csv, wst_id, soil_id, factor_values, factors):
+    """the treatment of the site and soil whose values are closest to the sampled factors
+    (distances normalized by the factor ranges), its weather dataset (and its values of the factors not sampled)
+    is used for the sample"""
+    def distance(t_data):
+        d = 0
+        for name, value in factor_values.items():
+            if name in TREATMENT_COLUMNS:
+                low, high = factors[name]
+                d += ((float(t_data[TREATMENT_COLUMNS[name]]) - value) / ((high - low) or 1)) ** 2
+        return d
+    return min((treatment_id for treatment_id, t_data in treatment_csv.items()
+                if t_data["WST_ID"] == wst_id and t_data["SOIL_ID"] == soil_id),
+               key=lambda treatment_id: distance(treatment_csv[treatment_id]))
+
 
 def run_producer(server=None, port=None):
     context = zmq.Context()
@@ -66,10 +91,35 @@ def run_producer(server=None, port=None):
         "sim.json": "sim.json",
         "crop.json": "crop.json",
         "site.json": "site.json",
+        "codec": "json",  # wire codec for the envs: json, orjson or msgpack (msgpack only towards climate_resolver)
+        "climate-store": "",  # e.g. input_data/WeatherStore -> send the climate data inline from the binary store
+        "climate-store-cache-size": "8",  # number of datasets kept decoded
+        "max-in-flight": "0",  # max number of envs not yet acknowledged by the consumers (ack-to=...), 0 = unlimited
+        "ack-port": "7780",
+        "credit-lease-s": "600",  # release the credit of an env not acknowledged within this time (lost on the way)
+        "manifest": "",  # e.g. out/manifest.jsonl (as written by the consumers) -> skip the envs already done
+        "job": "",  # id of the job, sent along in the customIds (consumers with shared-counter and the same job=)
+        "result-cache": "",  # directory shared with the consumers -> send cached results directly to the consumers
+        "monica-version": "3.6.36",  # part of the result cache key
+        "result-server-port": "7788",  # frontend of the out proxy (on server) the MONICA workers send their results to
+        "shard": "",  # i/n -> send only the i-th (0 based) of n deterministic partitions of the envs
+        "sweep-filter": "",  # on the columns of Treatment.csv, e.g. WST_ID=CAQC|FRLU;SOIL_ID=SILO -> only these envs
+        "resubmit": "",  # e.g. out/resubmit.json (as written by a consumer with resubmit-list=...) -> send only these envs
+        # lhs, sobol or morris -> sample the factors for each site and soil instead of the Treatment.csv grid,
+        # the weather data comes from the nearest grid treatment (customId treatment), the outputs are labeled
+        # with the sampled LAI and AWC
+        "sampler": "",
+        "sample-factors": "LAI=0:7;AWC=0:1",  # customData fields to sample and their ranges
+        "sample-size": "64",  # samples (lhs), base samples (sobol: size * (factors + 2) envs) or trajectories (morris)
+        "sample-seed": "1",
+        "morris-levels": "4",
     }
 
     common.update_config(config, sys.argv, print_config=True, allow_new_keys=False)
 
+    wire_codec = codec.get_codec(config["codec"])
+    shard = sharding.parse_shard(config["shard"])
+
     # select paths
     paths = PATHS[config["mode"]]
     # connect to monica proxy (if local, it will try to connect to a locally started monica)
@@ -128,9 +178,50 @@ def run_producer(server=None, port=None):
         "climate": ""
     })
 
+    wth_store = None
+    if config["climate-store"]:
+        wth_store = WthStore(config["climate-store"], path_to_wth_dir="input_data/WeatherData",
+                             cache_size=int(config["climate-store-cache-size"]))
+        col_to_acdi = header_to_acd_indices(sim_json["climate.csv-options"]["header-to-acd-names"])
+
+    done_envs = manifest.Manifest(config["manifest"]) if config["manifest"] else None
+    run_id = manifest.new_run_id()
+
+    credit_gate = flow_control.create_gate(context, config)
+
+    cached_results = None
+    if config["result-cache"]:
+        cached_results = result_cache.ResultCache(config["result-cache"], config["monica-version"])
+        result_socket = context.socket(zmq.PUSH)
+        result_socket.connect("tcp://" + config["server"] + ":" + str(config["result-server-port"]))
+
     sent_env_count = 0
+    sent_env_ids = []
+    skipped_env_count = 0
     start_time = time.perf_counter()
-    for treatment_id, t_data in treatment_csv.items():
+    if config["sampler"]:
+        factors = samplers.parse_factors(config["sample-factors"])
+        site_soils = {(t_data["WST_ID"], t_data["SOIL_ID"]): None for t_data in treatment_csv.values()}
+        sweep_axes = [
+            sweep.axis("site_soil", [{"WST_ID": wst_id, "SOIL_ID": soil_id} for wst_id, soil_id in site_soils]),
+            sweep.axis("sample", [{"sample": s["design"], "factors": s["factors"]} for s in samplers.create_samples(
+                config["sampler"], factors, int(config["sample-size"]), seed=int(config["sample-seed"]),
+                morris_levels=int(config["morris-levels"]))]),
+        ]
+    else:
+        sweep_axes = [
+            sweep.axis("treatment", [{"treatment_id": treatment_id, **t_data} for treatment_id, t_data in treatment_csv.items()]),
+        ]
+    # env ids follow the rows of Treatment.csv (or the samples), so they stay the same if envs are filtered or skipped
+    resubmit_ids = resubmit.load_list(config["resubmit"]) if config["resubmit"] else None
+    for env_id, point in sweep.numbered(sweep.points(sweep_axes), where=sweep.parse_filter(config["sweep-filter"]),
+                                        numbers=resubmit_ids):
+        if "sample" in point:
+            treatment_id = nearest_treatment_id(treatment_csv, point["WST_ID"], point["SOIL_ID"], point["factors"],
+                                                factors)
+        else:
+            treatment_id = point["treatment_id"]
+        t_data = treatment_csv[treatment_id]
         start_setup_time = time.perf_counter()
 
         soil_id = t_data["SOIL_ID"]
@@ -139,16 +230,21 @@ def run_producer(server=None, port=None):
         env_template["params"]["siteParameters"]["SoilProfileParameters"] = soil_profile
         env_template["params"]["siteParameters"]["Latitude"] = float(weather_metadata_csv[wst_id]["XLAT"])
         env_template["csvViaHeaderOptions"] = sim_json["climate.csv-options"]
-        env_template["pathToClimateCSV"] = f"{paths['monica-path-to-climate-dir']}/{t_data['WST_DATASET']}.WTH"
+        if wth_store:
+            env_template["climateData"] = {
+                **wth_store.climate_data(t_data["WST_DATASET"], col_to_acdi),
+                "tamp": float(weather_metadata_csv[wst_id]["TAMP"]),
+                "tav": float(weather_metadata_csv[wst_id]["TAV"]),
+            }
+            env_template["pathToClimateCSV"] = ""
+        else:
+            env_template["pathToClimateCSV"] = f"{paths['monica-path-to-climate-dir']}/{t_data['WST_DATASET']}.WTH"
         # print("pathToClimateCSV:", env_template["pathToClimateCSV"])
 
-        awc = float(t_data["AWC"])
-        env_template["params"]["userSoilTemperatureParameters"]["PlantAvailableWaterContentConst"] = awc
-
         #env_template["params"]["userEnvironmentParameters"]["Albedo"] = float(soil_metadata_csv[soil_id]["SALB"])
-        env_template["params"]["simulationParameters"]["customData"] = {
+        custom_data = env_template["params"]["simulationParameters"]["customData"] = {
             "LAI": float(t_data["LAID"]),
-            "AWC": awc,
+            "AWC": float(t_data["AWC"]),
             "CWAD": float(t_data["CWAD"]),
             "IRVAL": float(t_data["IRVAL"]),
             "MLTHK": float(t_data["MLTHK"]),
@@ -160,41 +256,78 @@ def run_producer(server=None, port=None):
             "TAMP": float(weather_metadata_csv[wst_id]["TAMP"]),
             "TAV": float(weather_metadata_csv[wst_id]["TAV"]),
         }
+        custom_data.update(point.get("factors", {}))
+        env_template["params"]["userSoilTemperatureParameters"]["PlantAvailableWaterContentConst"] = custom_data["AWC"]
 
         #if wst_id != "CAQC" or soil_id != "SALO" or int(t_data['LAID']) != 0 or int(float(t_data['AWC'])*100) != 0:
         #if wst_id != "FRLU" or soil_id != "SILO" or int(t_data['LAID']) != 7 or int(float(t_data['AWC'])*100) != 75:
         #if wst_id != "USMA" or soil_id != "SILO" or int(t_data['LAID']) != 7 or int(float(t_data['AWC'])*100) != 0:
         #   continue
 
+        factor_values = point.get("factors", {})
         env_template["customId"] = {
-            "env_id": sent_env_count + 1,
+            "env_id": env_id,
             "location": wst_id,
             "soil": soil_id,
-            "lai": f"L{t_data['LAID']}",
-            "aw": f"AW{t_data['AWC']}",
+            "lai": f"L{factor_values['LAI']:g}" if "LAI" in factor_values else f"L{t_data['LAID']}",
+            "aw": f"AW{factor_values['AWC']:g}" if "AWC" in factor_values else f"AW{t_data['AWC']}",
             
             "layerThickness": site_json["SiteParameters"]["LayerThickness"][0],
-            "profileLTs": list(map(lambda layer: layer["Thickness"][0], soil_profile))
+            "profileLTs": list(map(lambda layer: layer["Thickness"][0], soil_profile)),
+            "run": run_id,
         }
+        if config["job"]:
+            env_template["customId"]["job"] = config["job"]
+        if "sample" in point:
+            env_template["customId"]["sample"] = point["sample"]
+            env_template["customId"]["factors"] = point["factors"]
+            env_template["customId"]["treatment"] = treatment_id
 
         #with open(f"debug_out/env_{sent_env_count + 1}_{wst_id}_{soil_id}.json", "w") as _:
         #    json.dump(env_template, _, indent=2)
-        socket.send_json(env_template)
+
+        if not sharding.in_shard(env_template["customId"], shard):
+            continue
+
+        if done_envs or cached_results:
+            env_template["customId"]["fingerprint"] = fingerprint.env_fingerprint(env_template)
+            if done_envs and done_envs.is_done(env_template["customId"]["fingerprint"]):
+                skipped_env_count += 1
+                continue
+
+        credit_gate.acquire(env_id)
+        result_bytes = cached_results.get(env_template["customId"]["fingerprint"]) if cached_results else None
+        if result_bytes is not None:
+            result_socket.send(result_cache.cached_result_msg(result_bytes, env_template["customId"]))
+        else:
+            codec.send(socket, env_template, wire_codec)
         sent_env_count += 1
+        sent_env_ids.append(env_id)
 
         stop_setup_time = time.perf_counter()
         print("Setup: ", sent_env_count, " customId: " + str(env_template["customId"]) + " took ", (stop_setup_time - start_setup_time), " seconds")
 
     env_template["customId"] = {
         "no_of_sent_envs": sent_env_count,
+        "run": run_id,
+        "sent_env_ids": resubmit.to_ranges(sent_env_ids),
     }
-    socket.send_json(env_template)
+    if config["job"]:
+        env_template["customId"]["job"] = config["job"]
+    if config["shard"]:
+        env_template["customId"]["shard"] = config["shard"]
+    codec.send(socket, env_template, wire_codec)
+    credit_gate.close()
 
     stop_time = time.perf_counter()
 
     # write summary of used json files
     try:
-        print("sending ", (sent_env_count - 1), " envs took ", (stop_time - start_time), " seconds")
+        print("sending ", sent_env_count, " envs took ", (stop_time - start_time), " seconds")
+        if skipped_env_count:
+            print("skipped ", skipped_env_count, " envs already done according to the manifest")
+        if cached_results:
+            print(cached_results.summary())
         print("exiting run_producer()")
     except Exception:
         raise
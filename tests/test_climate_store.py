@@ -0,0 +1,29 @@
+import json
+
+from amei_exercises import climate_store
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send_multipart(self, frames):
+        self.sent.append(frames)
+
+
+def test_hash_doesnt_depend_on_the_key_order():
+    assert climate_store.climate_hash({"a": [1, 2], "b": 3}) == climate_store.climate_hash({"b": 3, "a": [1, 2]})
+    assert climate_store.climate_hash({"a": [1, 2]}) != climate_store.climate_hash({"a": [2, 1]})
+
+
+def test_climate_data_is_published_once():
+    socket = FakeSocket()
+    publisher = climate_store.ClimatePublisher(socket)
+    climate_data = [["2020-01-01", 1.5], ["2020-01-02", 2.5]]
+    h = publisher.publish(climate_data)
+    assert publisher.publish(json.loads(json.dumps(climate_data))) == h
+    assert h == climate_store.climate_hash(climate_data)
+    assert socket.sent == [[climate_store.CLIMATE_FRAME, h.encode("ascii"),
+                            climate_store.encode_climate_data(climate_data)]]
+    publisher.publish(climate_data[:1])
+    assert len(socket.sent) == 2
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from amei_exercises import codec
+
+MSG = {"customId": {"env_id": 1, "model_code": "MO"},
+       "data": [{"results": [{"Date": "2000-01-01", "TSAV": [1.5, 2.0], "n": 3, "s": "xä"}]}]}
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_round_trip(name):
+    if name != "json":
+        pytest.importorskip(name)
+    c = codec.get_codec(name)
+    frames = codec.encode_frames(MSG, c)
+    assert len(frames) == (1 if c.json_compatible else 2)
+    # the header frame of non JSON codecs overrides the receiver's codec
+    assert codec.decode_frames(frames, codec.get_codec("json")) == MSG
+
+
+def test_json_frames_are_plain_json():
+    frames = codec.encode_frames(MSG, codec.get_codec("json"))
+    assert frames == [codec.get_codec("json").encode(MSG)]
+
+
+def test_msgpack_numpy_arrays():
+    pytest.importorskip("msgpack")
+    c = codec.get_codec("msgpack")
+    a = np.arange(6, dtype=np.float32).reshape(2, 3)
+    decoded = c.decode(c.encode({"a": a, "x": np.float64(1.5)}))
+    np.testing.assert_array_equal(decoded["a"], a)
+    assert decoded["a"].dtype == np.float32 and decoded["x"] == 1.5
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.get_codec("xml")
@@ -0,0 +1,46 @@
+from amei_exercises.completion import SharedCounter
+
+
+def test_consumers_count_together(tmp_path):
+    path = tmp_path / "consumers.count"
+    a = SharedCounter(path, expected_shards=2, job="j1")
+    b = SharedCounter(path, expected_shards=2, job="j1")
+    assert not a.received("r1")
+    assert not b.sent(2, "r1", [[1, 2]], job="j1")
+    assert a.expected() is None  # the second shard hasn't finished yet
+    assert not b.received("r2", job="j1")
+    assert not a.received("r1", job="j1")
+    assert not a.sent(1, "r2", job="j1")
+    assert b.received("r1", job="j1")
+    assert a.poll()
+    assert a.expected() == 3 and a.received_count() == 3
+    assert a.sent_env_ids() == {"r1": [[1, 2]]}
+
+
+def test_other_jobs_are_ignored(tmp_path):
+    path = tmp_path / "consumers.count"
+    # an aborted job leaves an incomplete run behind
+    old = SharedCounter(path, job="j1")
+    old.received("r1", job="j1")
+    old.sent(5, "r1", job="j1")
+
+    new = SharedCounter(path, job="j2")
+    assert new.expected() is None and new.received_count() == 0
+    # late results of the old job don't count for the new one
+    assert not new.received("r1", job="j1")
+    assert not new.received("r2", job="j2")
+    assert new.sent(1, "r2", job="j2")
+    assert new.summary() == "completion of job j2: 1 of 1 envs received by all consumers"
+
+
+def test_complete_runs_without_job_are_stale(tmp_path):
+    path = tmp_path / "consumers.count"
+    first = SharedCounter(path)
+    first.received("r1")
+    assert first.sent(1, "r1")
+
+    second = SharedCounter(path)
+    assert second.expected() is None
+    second.received("r2")
+    assert second.sent(1, "r2")
+    assert second.received_count() == 1
@@ -0,0 +1,77 @@
+import json
+import threading
+
+import pytest
+import zmq
+
+from amei_exercises import codec, consumer, manifest
+
+
+def result(env_id, run="r1"):
+    return {"customId": {"env_id": env_id, "run": run, "model_code": "MO"},
+            "data": [{"results": [{"Tavg": float(env_id)}]}]}
+
+
+def write_results(msg, path_to_out):
+    path = path_to_out / f"{msg['customId']['env_id']}.json"
+    path.write_text(json.dumps(msg["data"]))
+    return [str(path)]
+
+
+def run_consumer(tmp_path, messages, **config_values):
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.PUSH)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    config = consumer.default_config("127.0.0.1", str(port))
+    config.update({"path_to_out": tmp_path, "timeout": 2000, "progress-every-s": "0"}, **config_values)
+
+    def send():
+        for msg in messages:
+            codec.send(socket, msg, codec.get_codec("json"))
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    try:
+        consumer.run(config, "test", write_results, lambda custom_id: ("MO", "1"), leave_on_timeout=True)
+    finally:
+        sender.join()
+        socket.close(linger=0)
+
+
+@pytest.mark.parametrize("writer_threads", ["0", "2"])
+def test_results_are_written_until_the_sent_envs_are_received(tmp_path, capsys, writer_threads):
+    path_to_manifest = str(tmp_path / "manifest.jsonl")
+    end = {"customId": {"no_of_sent_envs": 3, "run": "r1", "sent_env_ids": [[1, 3]]}}
+    run_consumer(tmp_path, [result(1), result(2), result(2), end, result(3)],
+                 manifest=path_to_manifest, **{"writer-threads": writer_threads})
+
+    out = capsys.readouterr().out
+    assert "last expected env received" in out
+    assert "skipped 1 duplicate results" in out
+    assert "no response from the server" not in out
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == ["1.json", "2.json", "3.json"]
+    assert manifest.Manifest(path_to_manifest).run_env_ids("r1") == {1, 2, 3}
+
+
+def test_restarted_consumer_counts_the_envs_written_before(tmp_path, capsys):
+    path_to_manifest = str(tmp_path / "manifest.jsonl")
+    end = {"customId": {"no_of_sent_envs": 3, "run": "r1"}}
+    run_consumer(tmp_path, [result(1), result(2)], manifest=path_to_manifest, timeout=200)
+    assert "no response from the server" in capsys.readouterr().out
+
+    run_consumer(tmp_path, [result(2), result(3), end], manifest=path_to_manifest)
+    out = capsys.readouterr().out
+    assert "continuing run r1 with 2 envs written before" in out
+    assert "skipped 1 duplicate results" in out
+    assert "last expected env received" in out
+
+
+def test_error_results_count_towards_the_expected_envs(tmp_path, capsys):
+    error = {"customId": {"env_id": 2, "run": "r1"}, "errors": ["no climate data"]}
+    end = {"customId": {"no_of_sent_envs": 2, "run": "r1", "sent_env_ids": [[1, 2]]}}
+    run_consumer(tmp_path, [result(1), error, end])
+
+    out = capsys.readouterr().out
+    assert "received 1 error results" in out
+    assert "outstanding 1 envs of run r1: env ids 2" in out
+    assert [p.name for p in tmp_path.glob("*.json")] == ["1.json"]
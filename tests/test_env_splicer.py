@@ -0,0 +1,45 @@
+import copy
+import json
+
+import pytest
+
+from amei_exercises import codec
+
+PATHS = [("params", "simulationParameters", "SoilTempModel"), ("customId",)]
+
+
+def env():
+    return {"customId": None, "params": {"simulationParameters": {"SoilTempModel": "internal", "x": 1}},
+            "climateData": {"data": {"3": [1.0, 2.5]}}}
+
+
+def expected(st_model, custom_id):
+    e = env()
+    e["params"]["simulationParameters"]["SoilTempModel"] = st_model
+    e["customId"] = custom_id
+    return e
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_splice_matches_full_encoding(name):
+    if name != "json":
+        pytest.importorskip(name)
+    c = codec.get_codec(name)
+    template = env()
+    splicer = codec.EnvSplicer(template, PATHS, c)
+    assert (splicer.parts is not None) == c.json_compatible
+    for st_model, custom_id in [("MO", {"env_id": 1, "model_code": "MO"}),
+                                ("SQ", {"env_id": 2, "note": "@@amei-splice-0@@ \"quoted\""})]:
+        frames = splicer.encode_frames(st_model, custom_id)
+        assert codec.decode_frames(frames, codec.get_codec("json")) == expected(st_model, custom_id)
+        if c.json_compatible:
+            assert frames == codec.encode_frames(expected(st_model, custom_id), c)
+
+
+def test_template_is_restored():
+    template = env()
+    del template["customId"]
+    before = copy.deepcopy(template)
+    splicer = codec.EnvSplicer(template, PATHS, codec.get_codec("json"))
+    assert template == before
+    assert json.loads(splicer.encode_frames("MO", {"env_id": 1})[0])["customId"] == {"env_id": 1}
@@ -0,0 +1,50 @@
+import socket
+import time
+
+import zmq
+
+from amei_exercises import flow_control
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+def test_acks_release_credits():
+    context = zmq.Context.instance()
+    port = free_port()
+    gate = flow_control.CreditGate(context, port, max_in_flight=2, wait_report_ms=50)
+    acks = flow_control.AckSender(context, f"localhost:{port}")
+    try:
+        gate.acquire(1)
+        gate.acquire(2)
+        assert gate.in_flight == 2
+        acks.ack(1)
+        acks.ack(7)  # unknown env ids don't release credits
+        gate.acquire(3)
+        assert (gate.in_flight, set(gate.leases)) == (2, {2, 3})
+        time.sleep(0.1)
+        gate._take_acks()
+        assert (gate.in_flight, gate.acked) == (2, 2)
+    finally:
+        acks.close()
+        gate.close()
+
+
+def test_expired_leases_release_credits(capsys):
+    context = zmq.Context.instance()
+    gate = flow_control.CreditGate(context, free_port(), max_in_flight=1, wait_report_ms=10, lease_s=0.05)
+    try:
+        gate.acquire(1)
+        gate.acquire(2)
+        assert (gate.in_flight, gate.expired, set(gate.leases)) == (1, 1, {2})
+        assert "released the credits of env ids [1]" in capsys.readouterr().out
+    finally:
+        gate.close()
+
+
+def test_no_gate_without_max_in_flight():
+    gate = flow_control.create_gate(None, {"max-in-flight": "0", "ack-port": "7780", "credit-lease-s": "600"})
+    assert isinstance(gate, flow_control.NoGate)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from amei_exercises.layer_store import DATA_FILE, INDEX_FILE, LayerStore, LayerStoreReader
+
+
+def test_round_trip(tmp_path):
+    store = LayerStore(tmp_path / "layers")
+    a = np.arange(2 * 3 * 2, dtype=np.float32).reshape(2, 3, 2)
+    store.append({"env_id": 1, "model_code": "MO"}, ["TSAV", "SWLD"], ["2000-01-01", "2000-01-02"], a)
+    results = [{"Date": "2000-01-01", "TSAV": [1.0, 2.0, 3.0], "SWLD": [0.1, 0.2, 0.3]},
+               {"Date": "2000-01-02", "TSAV": [4.0, 5.0, 6.0], "SWLD": [0.4, 0.5, 0.6]}]
+    store.append_results({"env_id": 2, "model_code": "SQ"}, results, ["TSAV", "SWLD"], layers=2)
+    assert store.envs_written == 2
+
+    reader = LayerStoreReader(tmp_path / "layers")
+    assert len(reader.records) == 2
+    rec = reader.find(model_code="MO")[0]
+    np.testing.assert_array_equal(reader.array(rec), a)
+    rec = reader.find(env_id=2)[0]
+    assert rec["dates"] == ["2000-01-01", "2000-01-02"]
+    assert rec["shape"] == [2, 2, 2]
+    np.testing.assert_allclose(reader.array(rec)[:, :, rec["variables"].index("SWLD")], [[0.1, 0.2], [0.4, 0.5]])
+    assert reader.find(model_code="XX") == []
+
+
+def test_empty_store(tmp_path):
+    LayerStore(tmp_path / "layers")
+    assert LayerStoreReader(tmp_path / "layers").records == []
+
+    (tmp_path / "layers" / DATA_FILE).touch()
+    (tmp_path / "layers" / INDEX_FILE).touch()
+    reader = LayerStoreReader(tmp_path / "layers")
+    assert reader.records == []
+    assert reader.find(env_id=1) == []
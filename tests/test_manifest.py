@@ -0,0 +1,89 @@
+import os
+
+from amei_exercises import fingerprint, manifest
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_done_envs_survive_a_reload(tmp_path):
+    out = write(tmp_path / "a.txt", "results")
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    m.add({"env_id": 1, "run": "r1", "fingerprint": "fp1"}, [out])
+    # a line cut off by a crashed consumer is ignored
+    with open(tmp_path / "manifest.jsonl", "a") as _:
+        _.write('{"fingerprint": "fp2", "env')
+
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    assert m.is_done("fp1")
+    assert not m.is_done("fp2")
+    assert set(manifest.load(tmp_path / "manifest.jsonl")) == {"fp1"}
+
+
+def test_changed_or_missing_outputs_are_not_done(tmp_path):
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    outs = [write(tmp_path / f"{i}.txt", "results") for i in range(4)]
+    for i, out in enumerate(outs):
+        m.add({"env_id": i, "fingerprint": f"fp{i}"}, [out])
+
+    write(tmp_path / "1.txt", "changed, other size")
+    # same size and content, only touched -> still done (digest check)
+    os.utime(outs[2], ns=(0, 0))
+    # same size, other content and time
+    write(tmp_path / "3.txt", "RESULTS")
+    os.utime(outs[3], ns=(0, 0))
+    assert [m.is_done(f"fp{i}") for i in range(4)] == [True, False, True, False]
+
+    os.remove(outs[0])
+    assert not m.is_done("fp0")
+
+
+def test_records_without_digests_only_need_their_outputs(tmp_path):
+    out = write(tmp_path / "a.txt", "results")
+    assert manifest.outputs_intact({"outputs": [out]})
+    os.remove(out)
+    assert not manifest.outputs_intact({"outputs": [out]})
+
+
+def test_env_key_without_fingerprint():
+    assert manifest.env_key({"env_id": 3, "run": "r1"}) == "r1:3"
+    assert manifest.env_key({"env_id": 3, "run": "r1", "fingerprint": "fp"}) == "fp"
+
+
+def test_fingerprint_ignores_custom_id_and_key_order():
+    env = {"customId": {"env_id": 1}, "params": {"a": 1, "b": [1, 2]}, "climateDataRef": "h"}
+    other = {"climateDataRef": "h", "params": {"b": [1, 2], "a": 1}, "customId": {"env_id": 2}}
+    fp = fingerprint.env_fingerprint(env)
+    assert fp == fingerprint.env_fingerprint(other)
+    assert env["customId"] == {"env_id": 1}
+    assert fp != fingerprint.env_fingerprint({**other, "params": {"a": 2, "b": [1, 2]}})
+
+    # a base fingerprint without the soil temperature model, combined per model
+    base = fingerprint.env_fingerprint(env, [("customId",), ("params", "a")])
+    assert env["params"]["a"] == 1
+    assert fingerprint.combine(base, 1) != fingerprint.combine(base, 2)
+
+
+def test_duplicates_by_run_and_env_id(tmp_path):
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    m.add({"env_id": 1, "run": "r1"}, [write(tmp_path / "1.txt", "results")])
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    assert m.is_duplicate({"env_id": 1, "run": "r1", "model_code": "MO"})
+    assert not m.is_duplicate({"env_id": 1, "run": "r2"})
+    assert not m.is_duplicate({"env_id": 2, "run": "r1"})
+    # without a producer run the env ids of different runs can't be told apart
+    m.add({"env_id": 3}, [write(tmp_path / "3.txt", "results")])
+    assert not m.is_duplicate({"env_id": 3})
+
+
+def test_envs_of_a_run_written_before_a_restart(tmp_path):
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    for env_id, run in ((1, "r1"), (2, "r1"), (2, "r1"), (1, "r2")):
+        m.add({"env_id": env_id, "run": run}, [write(tmp_path / f"{run}-{env_id}.txt", "results")])
+    m = manifest.Manifest(tmp_path / "manifest.jsonl")
+    assert m.run_count("r1") == 2
+    assert m.run_env_ids("r1") == {1, 2}
+    assert m.run_env_ids("r2") == {1}
+    assert m.run_count("r3") == 0
@@ -0,0 +1,44 @@
+from amei_exercises import manifest, progress, resubmit
+
+
+def test_ranges_round_trip():
+    ids = {12, 1, 2, 3, 5, 9, 10}
+    assert resubmit.to_ranges(ids) == [[1, 3], [5, 5], [9, 10], [12, 12]]
+    assert set(resubmit.from_ranges(resubmit.to_ranges(ids))) == ids
+    assert resubmit.format_ranges(ids) == "1-3,5,9-10,12"
+    assert resubmit.to_ranges([]) == []
+
+
+def test_list_round_trip(tmp_path):
+    path = tmp_path / "out" / "resubmit.json"
+    resubmit.write_list(path, [7, 3, 4])
+    assert resubmit.load_list(path) == {3, 4, 7}
+
+
+def test_outstanding_envs(tmp_path):
+    env_progress = progress.Progress()
+    assert env_progress.outstanding_summary({}).startswith("outstanding envs unknown")
+    for env_id in (1, 2, 5):
+        env_progress.received({"env_id": env_id, "run": "r1", "model_code": "MO"})
+    env_progress.sent("r1", [[1, 6]])
+    env_progress.sent("r2", None)
+
+    # env 3 has been written by another consumer sharing the manifest
+    done_envs = manifest.Manifest(tmp_path / "manifest.jsonl")
+    (tmp_path / "3.txt").write_text("results")
+    done_envs.add({"env_id": 3, "run": "r1"}, [str(tmp_path / "3.txt")])
+
+    missing = env_progress.outstanding(done_envs)
+    assert missing == {"r1": [4, 6]}
+    assert env_progress.outstanding_summary(missing) == "outstanding 2 envs of run r1: env ids 4,6"
+    assert env_progress.outstanding_summary({}) == "no outstanding envs"
+
+
+def test_progress_report():
+    env_progress = progress.Progress(report_every_s=3600)
+    env_progress.received({"env_id": 1, "model_code": "MO"})
+    assert env_progress.report(1, 4) is None
+    line = env_progress.report(2, 4, force=True)
+    assert line.startswith("progress: 2 of 4 (50.0 %) envs")
+    assert line.endswith("per model_code: MO: 1")
+    assert "of ? envs" in env_progress.report(2, None, force=True)
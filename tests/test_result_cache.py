@@ -0,0 +1,36 @@
+import json
+import os
+
+from amei_exercises import result_cache
+
+
+def test_round_trip_by_fingerprint_and_version(tmp_path):
+    cache = result_cache.ResultCache(tmp_path, "3.6.36")
+    msg = {"customId": {"env_id": 1}, "data": [{"results": [{"Tavg": 1.5}]}]}
+    cache.put("fp1", msg)
+
+    msg_bytes = result_cache.cached_result_msg(cache.get("fp1"), {"env_id": 7})
+    assert json.loads(msg_bytes) == {"customId": {"env_id": 7}, "fromResultCache": True, "data": msg["data"]}
+    assert cache.get("fp2") is None
+    assert result_cache.ResultCache(tmp_path, "3.6.37").get("fp1") is None
+    assert (cache.hits, cache.misses, cache.stored) == (1, 1, 1)
+
+
+def test_empty_result(tmp_path):
+    cache = result_cache.ResultCache(tmp_path, "3.6.36")
+    cache.put("fp", {"customId": {"env_id": 1}})
+    assert json.loads(result_cache.cached_result_msg(cache.get("fp"), {"env_id": 1})) == \
+        {"customId": {"env_id": 1}, "fromResultCache": True}
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    result = {"data": "x" * 1000}
+    cache = result_cache.ResultCache(tmp_path, "3.6.36", max_size_mb=3500 / 1024 / 1024)
+    for i in range(3):
+        cache.put(f"fp{i}", result)
+        os.utime(cache._path(f"fp{i}"), (i, i))
+    os.utime(cache._path("fp0"), (10, 10))  # fp0 has been used most recently
+
+    cache.put("fp3", result)
+    assert cache.evicted == 1
+    assert [cache.get(f"fp{i}") is not None for i in range(4)] == [True, False, True, True]
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from amei_exercises.result_store import ResultStore, read_messages
+
+
+def msg(env_id, results, sections=1):
+    return {"customId": {"env_id": env_id, "model_code": "MO"},
+            "data": [{"results": [dict(r) for r in results]} for _ in range(sections)]}
+
+
+def test_round_trip(tmp_path):
+    store = ResultStore(tmp_path, "ames")
+    stored = []
+    m1 = msg(1, [{"Date": "2000-01-01", "TSAV": [1.0, 2.0], "RHFD": 0.5}, {"Date": "2000-01-02"}], sections=2)
+    # different keys in the rows of a batch -> union of the columns, the missing ones are left out again
+    m2 = msg(2, [{"Date": "2000-01-01", "SWLD": [0.25], "n": 3}])
+    store.append(m1, "MO", "T1", on_stored=lambda: stored.append(1))
+    store.append(m2, "MO", "T2", on_stored=lambda: stored.append(2))
+    assert stored == []
+    store.close()
+    assert stored == [1, 2]
+    assert store.rows_written == 5
+
+    msgs = {m["customId"]["env_id"]: m for m in read_messages(tmp_path, "ames")}
+    assert msgs == {1: m1, 2: m2}
+
+
+def test_failing_batch_is_quarantined(tmp_path):
+    store = ResultStore(tmp_path, "ames")
+    stored = []
+    store.append(msg(1, [{"Date": "2000-01-01", "x": 1.0}]), "MO", "T1", on_stored=lambda: stored.append(1))
+    store.append(msg(2, [{"Date": "2000-01-01", "x": "not a number"}]), "MO", "T1", on_stored=lambda: stored.append(2))
+    store.append(msg(3, [{"Date": "2000-01-01", "x": 2.0}]), "SQ", "T1", on_stored=lambda: stored.append(3))
+    store.flush()
+    # only the envs of the failing (section, model_code) batch stay unrecorded
+    assert stored == [3]
+    assert store.rows_failed == 2
+    quarantined = list((tmp_path / "quarantine").glob("*.jsonl"))
+    assert len(quarantined) == 1
+    assert [json.loads(line)["x"] for line in quarantined[0].read_text().splitlines()] == [1.0, "not a number"]
+
+    # the store keeps working
+    store.append(msg(4, [{"Date": "2000-01-01", "x": 3.0}]), "MO", "T1", on_stored=lambda: stored.append(4))
+    store.close()
+    assert stored == [3, 4]
+    assert sorted(m["customId"]["env_id"] for m in read_messages(tmp_path, "ames")) == [3, 4]
+
+
+def test_flush_bounds(tmp_path):
+    store = ResultStore(tmp_path, "ames", flush_rows=3)
+    store.append(msg(1, [{"Date": "2000-01-01"}] * 2), "MO", "T1")
+    assert store.files_written == 0
+    store.append(msg(2, [{"Date": "2000-01-01"}]), "MO", "T1")
+    assert store.files_written == 1
+
+    store = ResultStore(tmp_path / "s", "ames", flush_s=0)
+    store.append(msg(1, [{"Date": "2000-01-01"}]), "MO", "T1")
+    assert store.rows_written == 1
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from amei_exercises import samplers
+
+
+def test_sobol_sequence_known_values():
+    # the first points of the Joe-Kuo Sobol' sequence in 3 dimensions
+    expected = [[0.0, 0.0, 0.0], [0.5, 0.5, 0.5], [0.75, 0.25, 0.25], [0.25, 0.75, 0.75],
+                [0.375, 0.375, 0.625], [0.875, 0.875, 0.125], [0.625, 0.125, 0.875], [0.125, 0.625, 0.375]]
+    np.testing.assert_array_equal(samplers.sobol_sequence(8, 3), expected)
+    np.testing.assert_array_equal(samplers.sobol_sequence(4, 3, skip=4), expected[4:])
+
+
+def test_sobol_sequence_matches_scipy():
+    qmc = pytest.importorskip("scipy.stats.qmc")
+    dims = samplers.MAX_SOBOL_DIMS
+    np.testing.assert_array_equal(samplers.sobol_sequence(128, dims), qmc.Sobol(dims, scramble=False).random(128))
+
+
+def test_saltelli_design():
+    samples = samplers.saltelli_samples(4, 3)
+    assert len(samples) == 4 * (3 + 2)
+    for j in range(4):
+        a, b, *abs_ = samples[j * 5:(j + 1) * 5]
+        assert (a["design"]["matrix"], b["design"]["matrix"]) == ("A", "B")
+        for i, ab in enumerate(abs_):
+            assert ab["design"]["factor"] == i
+            expected = a["x"].copy()
+            expected[i] = b["x"][i]
+            np.testing.assert_array_equal(ab["x"], expected)
+
+
+def test_saltelli_factor_limit():
+    max_factors = samplers.MAX_SOBOL_DIMS // 2
+    assert len(samplers.saltelli_samples(1, max_factors)) == max_factors + 2
+    with pytest.raises(ValueError, match="at most"):
+        samplers.saltelli_samples(1, max_factors + 1)
+
+
+def test_latin_hypercube_strata():
+    x = samplers.latin_hypercube(10, 3, np.random.default_rng(1))
+    for d in range(3):
+        assert sorted(np.floor(x[:, d] * 10).astype(int)) == list(range(10))
+
+
+def test_morris_trajectories():
+    samples = samplers.morris_samples(3, 4, levels=4)
+    assert len(samples) == 3 * (4 + 1)
+    for r in range(3):
+        trajectory = samples[r * 5:(r + 1) * 5]
+        assert sorted(s["design"]["factor"] for s in trajectory[1:]) == [0, 1, 2, 3]
+        for prev, s in zip(trajectory, trajectory[1:]):
+            diff = s["x"] - prev["x"]
+            i = s["design"]["factor"]
+            assert diff[i] == pytest.approx(s["design"]["delta"]) and abs(s["design"]["delta"]) == pytest.approx(2 / 3)
+            assert np.count_nonzero(diff) == 1
+            assert 0 <= s["x"][i] <= 1
+
+
+def test_create_samples_scales_factors():
+    factors = samplers.parse_factors("LAI=0:7; AWC=0:1;")
+    assert factors == {"LAI": (0.0, 7.0), "AWC": (0.0, 1.0)}
+    samples = samplers.create_samples("sobol", factors, 2)
+    assert len(samples) == 2 * 4
+    # the first base sample after skipping 2 points is (0.75, 0.25 | 0.25, 0.25)
+    assert samples[0]["factors"] == {"LAI": 5.25, "AWC": 0.25}
+    assert samples[1]["factors"] == {"LAI": 1.75, "AWC": 0.25}
+    assert samples[2]["design"] == {"sampler": "sobol", "sample": 0, "matrix": "AB", "factor": "LAI",
+                                    "id": "sobol00000ABLAI"}
+    assert samples[2]["factors"] == {"LAI": 1.75, "AWC": 0.25}
+    with pytest.raises(ValueError):
+        samplers.create_samples("grid", factors, 2)
@@ -0,0 +1,85 @@
+import math
+import random
+
+import pytest
+
+from amei_exercises import samplers, sensitivity
+
+FACTORS = {"a": (0.0, 1.0), "b": (0.0, 1.0), "c": (0.0, 1.0)}
+
+
+def model(factors):
+    # additive, the variances of the terms are 1/12, 4/12 and 0
+    return {("y", 0, "mean"): factors["a"] + 2 * factors["b"]}
+
+
+def add_all(indices, samples, group=("g",)):
+    for s in samples:
+        indices.add(group, s["design"], list(FACTORS), model(s["factors"]))
+
+
+def test_running_stats():
+    stats = sensitivity.RunningStats()
+    for x in (2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0):
+        stats.add(x)
+    assert stats.mean == pytest.approx(5.0)
+    assert stats.variance == pytest.approx(4.0)
+    assert math.isnan(sensitivity.RunningStats().variance)
+
+
+def test_summarize():
+    summary = sensitivity.summarize([{"T": 1.0, "TS": [1.0, 2.0]}, {"T": 3.0, "TS": [5.0, 2.0]}],
+                                    {"tavg": "T", "soil": "TS"})
+    assert summary[("tavg", 0, "mean")] == 2.0
+    assert summary[("tavg", 0, "amplitude")] == 2.0
+    assert summary[("soil", 1, "amplitude")] == 4.0
+    assert summary[("soil", 2, "mean")] == 2.0
+
+
+def test_sobol_indices_of_an_additive_function():
+    indices = sensitivity.create_indices("sobol")
+    add_all(indices, samplers.create_samples("sobol", FACTORS, 1024))
+    result = indices.indices()
+    assert indices.incomplete == 0
+    for factor, expected in (("a", 0.2), ("b", 0.8), ("c", 0.0)):
+        s1, st, n = result[(("g",), ("y", 0, "mean"), factor)]
+        assert n == 1024
+        assert s1 == pytest.approx(expected, abs=0.02)
+        assert st == pytest.approx(expected, abs=0.02)
+
+
+def test_sobol_indices_dont_depend_on_the_order_of_the_results():
+    samples = samplers.create_samples("sobol", FACTORS, 64)
+    in_order = sensitivity.SobolIndices()
+    add_all(in_order, samples)
+    shuffled = sensitivity.SobolIndices()
+    random.Random(1).shuffle(samples)
+    add_all(shuffled, samples[:-1])
+    assert shuffled.incomplete == 1
+    add_all(shuffled, samples[-1:])
+    assert shuffled.incomplete == 0
+    for key, values in in_order.indices().items():
+        assert shuffled.indices()[key] == pytest.approx(values)
+
+
+def test_morris_indices_of_a_linear_function():
+    indices = sensitivity.create_indices("morris")
+    add_all(indices, samplers.create_samples("morris", FACTORS, 10))
+    assert indices.incomplete == 0
+    for factor, effect in (("a", 1.0), ("b", 2.0), ("c", 0.0)):
+        mu, mu_star, sigma, n = indices.indices()[(("g",), ("y", 0, "mean"), factor)]
+        assert n == 10
+        assert mu == pytest.approx(effect)
+        assert mu_star == pytest.approx(effect)
+        assert sigma == pytest.approx(0.0, abs=1e-9)
+
+
+def test_no_indices_for_lhs(tmp_path):
+    assert sensitivity.create_indices("lhs") is None
+    indices = sensitivity.SobolIndices()
+    add_all(indices, samplers.create_samples("sobol", FACTORS, 4))
+    path = tmp_path / "sobol.csv"
+    sensitivity.write_csv(path, indices, ["site"], ["output", "layer", "statistic"])
+    lines = path.read_text().splitlines()
+    assert lines[0] == "site,output,layer,statistic,factor,S1,ST,n"
+    assert len(lines) == 4 and lines[1].startswith("g,y,0,mean,a,")
@@ -0,0 +1,26 @@
+import pytest
+
+from amei_exercises import sharding
+
+
+def test_parse_shard():
+    assert sharding.parse_shard("") == (0, 1)
+    assert sharding.parse_shard("2/3") == (2, 3)
+    for spec in ("3/3", "-1/2", "0/0"):
+        with pytest.raises(ValueError):
+            sharding.parse_shard(spec)
+
+
+def test_shards_partition_the_envs():
+    custom_ids = [{"env_id": i, "model_code": mc, "treatment_id": str(t), "run": "r1"}
+                  for i, (mc, t) in enumerate((mc, t) for mc in ("MO", "SQ", "DS") for t in range(20))]
+    shards = [[c["env_id"] for c in custom_ids if sharding.in_shard(c, (i, 3))] for i in range(3)]
+    assert sorted(env_id for shard in shards for env_id in shard) == list(range(60))
+    assert all(shard for shard in shards)
+    assert all(sharding.in_shard(c, (0, 1)) for c in custom_ids)
+
+
+def test_shard_ignores_ids_of_the_run():
+    custom_id = {"env_id": 1, "model_code": "MO", "treatment_id": "1"}
+    other_run = {**custom_id, "env_id": 7, "run": "r2", "job": "j", "fingerprint": "fp"}
+    assert sharding.shard_of(custom_id, 5) == sharding.shard_of(other_run, 5)
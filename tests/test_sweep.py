@@ -0,0 +1,62 @@
+import pytest
+
+from amei_exercises import sweep
+
+PLOTS_OF = {"1": ["a", "b"], "2": ["c"]}
+
+
+def axes():
+    return [sweep.axis("treatment", [{"t_id": "1"}, {"t_id": "2"}]),
+            sweep.axis("plot", lambda point: [{"p_id": p_id} for p_id in PLOTS_OF[point["t_id"]]]),
+            sweep.axis("model", [{"model_code": "MO"}, {"model_code": "SQ"}])]
+
+
+def test_points_in_declaration_order():
+    keys = [(p["t_id"], p["p_id"], p["model_code"]) for p in sweep.points(axes())]
+    assert keys == [("1", "a", "MO"), ("1", "a", "SQ"), ("1", "b", "MO"), ("1", "b", "SQ"),
+                    ("2", "c", "MO"), ("2", "c", "SQ")]
+
+
+def test_points_in_given_order():
+    keys = [(p["model_code"], p["t_id"], p["p_id"]) for p in sweep.points(axes(), order=sweep.parse_order("model"))]
+    assert keys == [("MO", "1", "a"), ("MO", "1", "b"), ("MO", "2", "c"),
+                    ("SQ", "1", "a"), ("SQ", "1", "b"), ("SQ", "2", "c")]
+    with pytest.raises(ValueError):
+        list(sweep.points(axes(), order=["crop"]))
+
+
+def test_parse_order():
+    assert sweep.parse_order("") is None
+    assert sweep.parse_order(" model, treatment ,") == ["model", "treatment"]
+
+
+def test_parse_filter():
+    assert sweep.parse_filter("") is None
+    where = sweep.parse_filter("model_code=MO|iMO; t_id=1;")
+    assert where({"model_code": "iMO", "t_id": "1"})
+    assert not where({"model_code": "SQ", "t_id": "1"})
+    assert not where({"model_code": "MO", "t_id": "2"})
+    assert sweep.parse_filter("t_id=1")({"t_id": 1})
+
+
+def test_numbers_dont_depend_on_the_filter():
+    all_points = dict(sweep.numbered(sweep.points(axes())))
+    filtered = list(sweep.numbered(sweep.points(axes()), where=sweep.parse_filter("model_code=SQ")))
+    assert [n for n, _ in filtered] == [2, 4, 6]
+    assert all(all_points[n] == p for n, p in filtered)
+    assert [n for n, _ in sweep.numbered(sweep.points(axes()), numbers={1, 2, 5})] == [1, 2, 5]
+
+
+def test_group_consecutive():
+    groups = list(sweep.group_consecutive(sweep.numbered(sweep.points(axes())), ["t_id", "p_id"]))
+    assert [[n for n, _ in group] for group in groups] == [[1, 2], [3, 4], [5, 6]]
+
+
+def test_override_axes():
+    overrides = [sweep.override_axis("albedo", ("params", "Albedo"), [0.2, 0.3]),
+                 sweep.override_axis("depth", ("params", "site", "Depth"), [1])]
+    points = list(sweep.points(overrides))
+    assert points[1]["albedo"] == 0.3
+    env = {"params": {"Albedo": 0.1, "site": {"Depth": 2}}}
+    sweep.apply_overrides(env, points[1])
+    assert env == {"params": {"Albedo": 0.3, "site": {"Depth": 1}}}
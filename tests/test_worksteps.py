@@ -0,0 +1,31 @@
+from amei_exercises.worksteps import compile_worksteps
+
+
+def ws(kind, date):
+    return {"type": kind, "date": date}
+
+
+def test_merge_around_sowing_and_harvest():
+    sowing = ws("Sowing", "1993-01-10")
+    harvest = ws("Harvest", "1993-06-01")
+    fertilization = [ws("F", "1993-01-01"), ws("F", "1993-01-10"), ws("F", "1993-03-01")]
+    irrigation = [ws("I", "1993-01-10"), ws("I", "1993-02-01"), ws("I", "1993-06-01"), ws("I", "1993-07-01")]
+    fertilization_before = list(fertilization)
+
+    compiled = compile_worksteps(sowing, harvest, fertilization, irrigation)
+
+    assert [(w["type"], w["date"]) for w in compiled] == [
+        ("F", "1993-01-01"),
+        ("Sowing", "1993-01-10"),
+        # events at the sowing or harvest date are part of the season, same dates keep the order of the streams
+        ("F", "1993-01-10"), ("I", "1993-01-10"),
+        ("I", "1993-02-01"), ("F", "1993-03-01"), ("I", "1993-06-01"),
+        ("Harvest", "1993-06-01"),
+        ("I", "1993-07-01"),
+    ]
+    assert fertilization == fertilization_before
+
+
+def test_without_events():
+    sowing, harvest = ws("Sowing", "1993-01-10"), ws("Harvest", "1993-06-01")
+    assert compile_worksteps(sowing, harvest) == [sowing, harvest]
@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from amei_exercises import writer_pool
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_all_results_are_written(threads):
+    written = []
+    failed = []
+    main_thread = threading.current_thread()
+    write_threads = set()
+
+    def write(msg):
+        write_threads.add(threading.current_thread() is main_thread)
+        if msg["env_id"] == 3:
+            raise IOError("disk full")
+        return [f"{msg['env_id']}.csv"]
+
+    pool = writer_pool.WriterPool(write, lambda msg, outputs: written.append((msg["env_id"], outputs)),
+                                  threads=threads, max_queued=2, report_every_s=0,
+                                  failed=lambda msg, e: failed.append((msg["env_id"], str(e))))
+    for env_id in range(10):
+        pool.submit({"env_id": env_id})
+    pool.close()
+
+    assert sorted(written) == [(i, [f"{i}.csv"]) for i in range(10) if i != 3]
+    assert failed == [(3, "disk full")]
+    assert (pool.submitted, pool.done, pool.failed) == (10, 9, 1)
+    assert write_threads == {threads == 0}
+    assert "9 of 10 written, 1 failed" in pool.summary()
+
+
+def test_create_writer_from_the_consumer_config():
+    pool = writer_pool.create_writer(lambda msg: [], None, {"writer-threads": "3", "writer-queue": "5"})
+    assert pool.threads == 3
+    pool.close()